@@ -5,6 +5,39 @@ CREATE TABLE currencies (
     rate NUMERIC(10, 4) NOT NULL
 );
 
+-- Название валюты уникально: на индекс опирается INSERT ... ON CONFLICT в currency_manager.
+-- Для существующей базы перед созданием индекса нужно удалить повторяющиеся названия.
+CREATE UNIQUE INDEX IF NOT EXISTS currencies_currency_name_key ON currencies (currency_name);
+
+-- Уведомления об изменениях currencies для таблицы курсов в памяти data_manager (lab-6):
+-- каждая вставка, изменение и удаление (и TRUNCATE) отправляет в канал currencies_changed
+-- JSON с операцией, строкой и временем изменения
+CREATE OR REPLACE FUNCTION notify_currencies_changed() RETURNS trigger AS $$
+DECLARE
+    changed RECORD;
+BEGIN
+    IF TG_OP = 'TRUNCATE' THEN
+        PERFORM pg_notify('currencies_changed', json_build_object(
+            'op', TG_OP, 'ts', extract(epoch FROM clock_timestamp()))::text);
+        RETURN NULL;
+    END IF;
+    IF TG_OP = 'DELETE' THEN
+        changed := OLD;
+    ELSE
+        changed := NEW;
+    END IF;
+    PERFORM pg_notify('currencies_changed', json_build_object(
+        'op', TG_OP, 'id', changed.id, 'currency_name', changed.currency_name,
+        'rate', changed.rate, 'ts', extract(epoch FROM clock_timestamp()))::text);
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE TRIGGER currencies_changed AFTER INSERT OR UPDATE OR DELETE ON currencies
+    FOR EACH ROW EXECUTE FUNCTION notify_currencies_changed();
+CREATE TRIGGER currencies_truncated AFTER TRUNCATE ON currencies
+    FOR EACH STATEMENT EXECUTE FUNCTION notify_currencies_changed();
+
 -- Создание таблицы admins
 CREATE TABLE admins (
     id SERIAL PRIMARY KEY,
@@ -6,6 +6,7 @@ from aiogram.fsm.context import FSMContext # Для хранения проме
 from aiogram.fsm.state import State, StatesGroup # Состояния FSM
 from aiogram.utils.keyboard import ReplyKeyboardBuilder # Для создания клавиатур
 import psycopg2 # Для работы с PostgreSQL
+from sqlite_storage import SQLiteStorage # Постоянное хранилище состояний FSM
 
 # Настройка логирования: выводится информация в консоль
 logging.basicConfig(level=logging.INFO)
@@ -17,7 +18,8 @@ API_TOKEN = os.getenv("API_TOKEN")
 # Создаём экземпляр бота
 bot = Bot(token=API_TOKEN)
 # Создаём диспетчер (обработчик команд)
-dp = Dispatcher()
+# Состояния FSM хранятся в SQLite: незавершённые диалоги переживают перезапуск
+dp = Dispatcher(storage=SQLiteStorage(os.getenv("FSM_STORAGE_PATH", "fsm.sqlite3")))
 
 # Функция для подключения к базе данных
 def get_db_connection():
@@ -429,8 +431,12 @@ async def convert_amount(message: types.Message, state: FSMContext):
 
 # Основная асинхронная функция для запуска бота
 async def main() -> None:
-    # Запускаем бесконечный цикл опроса серверов на новые сообщения
-    await dp.start_polling(bot)
+    try:
+        # Запускаем бесконечный цикл опроса серверов на новые сообщения
+        await dp.start_polling(bot)
+    finally:
+        # Дописываем накопленные изменения состояний
+        await dp.storage.close()
 
 if __name__ == "__main__":
     import asyncio
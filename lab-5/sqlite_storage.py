@@ -0,0 +1,193 @@
+import json # Для хранения данных состояния
+import asyncio # Для отложенной записи
+import logging # Для записи ошибок фоновой записи
+import sqlite3 # Встроенная база данных
+from concurrent.futures import ThreadPoolExecutor # Поток записи
+from aiogram.fsm.state import State # Класс состояния
+from aiogram.fsm.storage.base import BaseStorage # Базовый класс хранилища FSM
+
+logger = logging.getLogger(__name__)
+
+
+# Хранилище состояний FSM в локальной базе SQLite (режим WAL).
+# - Состояния переживают перезапуск бота, а несколько процессов бота
+#   могут работать с одним файлом: SQLite сериализует запись между процессами.
+# - Записи копятся в памяти и фиксируются одной транзакцией раз в
+#   flush_interval секунд или при накоплении batch_size ключей.
+# - Запись выполняется в отдельном потоке со своим соединением: ожидание
+#   блокировки записи, которую держит другой процесс (до 5 с), не останавливает
+#   цикл событий, а ошибки записи не попадают в обработчики - изменения
+#   остаются в очереди и записываются повторно.
+# - Прочитанные записи хранятся в памяти. Кэш сбрасывается, когда
+#   PRAGMA data_version показывает, что базу изменило другое соединение
+#   (другой процесс или поток записи); до завершения записи чтение
+#   накладывает ещё не записанные изменения поверх базы.
+# Методы принимают необязательный аргумент bot, поэтому хранилище
+# работает и с aiogram 3.0.0b7, и с aiogram 3.0.0.
+class SQLiteStorage(BaseStorage):
+    def __init__(self, path: str = "fsm.sqlite3", flush_interval: float = 0.05,
+                 batch_size: int = 100):
+        self.path = path
+        self.flush_interval = flush_interval
+        self.batch_size = batch_size
+        # Соединение записи используется только потоком записи
+        self._writer = sqlite3.connect(path, timeout=5.0, isolation_level=None, check_same_thread=False)
+        self._writer.execute("PRAGMA journal_mode = WAL")
+        # В режиме WAL NORMAL не делает fsync на каждый commit
+        self._writer.execute("PRAGMA synchronous = NORMAL")
+        self._writer.execute(
+            "CREATE TABLE IF NOT EXISTS fsm ("
+            "key TEXT PRIMARY KEY, "
+            "state TEXT, "
+            "data TEXT NOT NULL DEFAULT '{}')"
+        )
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="fsm-writer")
+        # Соединение чтения работает в потоке цикла событий; в режиме WAL
+        # чтение не ждёт пишущих
+        self._conn = sqlite3.connect(path, timeout=5.0, isolation_level=None)
+        self._cache = {}  # ключ -> [состояние, данные]
+        self._pending = {}  # ключ -> изменённые поля {"state": ..., "data": ...}
+        self._flushing = {}  # Изменения, которые сейчас записывает поток записи
+        self._flush_future = None
+        self._data_version = self._read_data_version()
+        self._flush_handle = None
+
+    # Строковый ключ записи (поля StorageKey различаются в версиях aiogram)
+    @staticmethod
+    def _key(key) -> str:
+        return ":".join(str(part) for part in (
+            key.bot_id, key.chat_id, key.user_id,
+            getattr(key, "thread_id", None), getattr(key, "destiny", "default")
+        ))
+
+    def _read_data_version(self) -> int:
+        return self._conn.execute("PRAGMA data_version").fetchone()[0]
+
+    # Запись из кэша; при промахе читаем из базы и накладываем незаписанные изменения
+    def _record(self, key: str) -> list:
+        version = self._read_data_version()
+        if version != self._data_version:
+            # Базу изменило другое соединение - кэш мог устареть
+            self._data_version = version
+            self._cache.clear()
+
+        record = self._cache.get(key)
+        if record is None:
+            row = self._conn.execute("SELECT state, data FROM fsm WHERE key = ?", (key,)).fetchone()
+            record = [row[0], json.loads(row[1])] if row else [None, {}]
+            for changes in (self._flushing, self._pending):
+                fields = changes.get(key, {})
+                if "state" in fields:
+                    record[0] = fields["state"]
+                if "data" in fields:
+                    record[1] = fields["data"]
+            self._cache[key] = record
+        return record
+
+    # Запоминаем изменение и планируем запись в базу
+    def _write(self, key: str, field: str, value):
+        self._pending.setdefault(key, {})[field] = value
+        record = self._cache.get(key)
+        if record is not None:
+            record[0 if field == "state" else 1] = value
+
+        if self.flush_interval <= 0 or len(self._pending) >= self.batch_size:
+            self.flush()
+        else:
+            self._schedule(self.flush_interval)
+
+    def _schedule(self, delay: float):
+        if self._flush_handle is None:
+            self._flush_handle = asyncio.get_running_loop().call_later(delay, self.flush)
+
+    # Передаём накопленные изменения потоку записи (одна запись одновременно)
+    def flush(self):
+        if self._flush_handle is not None:
+            self._flush_handle.cancel()
+            self._flush_handle = None
+        if self._flush_future is not None or not self._pending:
+            return
+        self._flushing, self._pending = self._pending, {}
+        self._flush_future = asyncio.get_running_loop().run_in_executor(
+            self._executor, self._write_batch, self._flushing
+        )
+        self._flush_future.add_done_callback(self._flushed)
+
+    # Запись завершена (выполняется в цикле событий)
+    def _flushed(self, future):
+        batch, self._flushing, self._flush_future = self._flushing, {}, None
+        error = None if future.cancelled() else future.exception()
+        if error is not None:
+            logger.error(f"Ошибка записи состояний FSM ({len(batch)} ключей), повтор позже: {error}")
+            # Возвращаем изменения в очередь (более новые имеют приоритет)
+            for key, fields in batch.items():
+                self._pending[key] = {**fields, **self._pending.get(key, {})}
+            self._schedule(max(self.flush_interval, 1.0))
+        elif self._pending:
+            if self.flush_interval <= 0 or len(self._pending) >= self.batch_size:
+                self.flush()
+            else:
+                self._schedule(self.flush_interval)
+
+    # Фиксируем пакет изменений одной транзакцией (в потоке записи)
+    def _write_batch(self, pending: dict):
+        states = [(key, fields["state"]) for key, fields in pending.items() if "state" in fields]
+        data = [(key, json.dumps(fields["data"], ensure_ascii=False))
+                for key, fields in pending.items() if "data" in fields]
+        try:
+            self._writer.execute("BEGIN IMMEDIATE")
+            self._writer.executemany(
+                "INSERT INTO fsm (key, state) VALUES (?, ?) "
+                "ON CONFLICT (key) DO UPDATE SET state = excluded.state",
+                states
+            )
+            self._writer.executemany(
+                "INSERT INTO fsm (key, data) VALUES (?, ?) "
+                "ON CONFLICT (key) DO UPDATE SET data = excluded.data",
+                data
+            )
+            # Пустые записи (состояние сброшено) не храним
+            self._writer.executemany(
+                "DELETE FROM fsm WHERE key = ? AND state IS NULL AND data = '{}'",
+                [(key,) for key in pending]
+            )
+            self._writer.execute("COMMIT")
+        except Exception:
+            if self._writer.in_transaction:
+                self._writer.execute("ROLLBACK")
+            raise
+
+    async def set_state(self, key=None, state=None, bot=None):
+        value = state.state if isinstance(state, State) else state
+        self._write(self._key(key), "state", value)
+
+    async def get_state(self, key=None, bot=None):
+        return self._record(self._key(key))[0]
+
+    async def set_data(self, key=None, data=None, bot=None):
+        self._write(self._key(key), "data", dict(data or {}))
+
+    async def get_data(self, key=None, bot=None):
+        return dict(self._record(self._key(key))[1])
+
+    # Дописываем изменения и закрываем базу (повторный вызов ничего не делает)
+    async def close(self):
+        if self._conn is None:
+            return
+        # Дожидаемся текущей записи, затем записываем то, что накопилось за это время
+        for _ in range(2):
+            self.flush()
+            if self._flush_future is not None:
+                await asyncio.wait([self._flush_future])
+        if self._flush_handle is not None:
+            self._flush_handle.cancel()
+            self._flush_handle = None
+        if self._pending:
+            logger.error(f"Не записаны состояния FSM для {len(self._pending)} ключей")
+        self._executor.shutdown(wait=True)
+        self._writer.close()
+        self._conn.close()
+        self._conn = None
+
+    async def wait_closed(self):
+        pass
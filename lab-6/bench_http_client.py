@@ -0,0 +1,52 @@
+import sys  # Чтение аргументов командной строки
+import time  # Замер времени
+import asyncio  # Запуск асинхронного кода
+import aiohttp  # Асинхронные HTTP-запросы
+from http_client import create_http_session  # Общий HTTP-клиент бота
+
+# Сколько шагов диалога выполняется в каждом режиме
+STEPS = 500
+
+
+# Перцентиль (p от 0 до 1) отсортированного списка
+def percentile(values, p: float) -> float:
+    return values[min(int(len(values) * p), len(values) - 1)]
+
+
+# Один шаг диалога - один GET к микросервису (как проверка администратора)
+async def step(session, url: str):
+    async with session.get(url) as resp:
+        await resp.read()
+
+
+# Прежний способ: новая сессия (и новое TCP-соединение) на каждый шаг
+async def step_new_session(url: str):
+    async with aiohttp.ClientSession() as session:
+        await step(session, url)
+
+
+async def measure(name: str, make_step):
+    timings = []
+    for _ in range(STEPS):
+        started = time.perf_counter()
+        await make_step()
+        timings.append((time.perf_counter() - started) * 1000)
+    timings.sort()
+    print(f"{name:16} p50 {percentile(timings, 0.5):.2f} мс, p95 {percentile(timings, 0.95):.2f} мс, "
+          f"среднее {sum(timings) / len(timings):.2f} мс")
+
+
+async def main(url: str):
+    await measure("новая сессия", lambda: step_new_session(url))
+    session = create_http_session()
+    try:
+        await step(session, url)  # Открываем соединение заранее
+        await measure("общая сессия", lambda: step(session, url))
+    finally:
+        await session.close()
+
+
+if __name__ == "__main__":
+    # Использование: python bench_http_client.py [URL]
+    # По умолчанию - проверка администратора в запущенном currency_manager.py
+    asyncio.run(main(sys.argv[1] if len(sys.argv) > 1 else "http://127.0.0.1:5001/is_admin/0"))
@@ -1,5 +1,10 @@
 from flask import Flask, request, jsonify
 import psycopg2
+from psycopg2.extras import execute_values
+import os
+import time
+import threading
+from contextlib import contextmanager
 
 # Инициализация Flask приложения
 app = Flask(__name__)
@@ -14,58 +19,232 @@ DB_CONFIG = {
 }
 
 
+# Размер пула: по одному соединению на поток WSGI-сервера
+DB_POOL_SIZE = int(os.getenv('DB_POOL_SIZE', os.getenv('WSGI_THREADS', '8')))
+# Сколько секунд запрос ждёт свободное соединение, прежде чем получить 503
+DB_POOL_TIMEOUT = float(os.getenv('DB_POOL_TIMEOUT', '5'))
+# Соединение, простоявшее без дела дольше, проверяется запросом SELECT 1 перед выдачей
+DB_POOL_CHECK_AFTER = float(os.getenv('DB_POOL_CHECK_AFTER', '30'))
+
+
 # Устанавливает и возвращает соединение с базой данных
 def get_db_connection():
     return psycopg2.connect(**DB_CONFIG)
 
 
-# Эндпоинт для добавления новой валюты
+# Свободное соединение не появилось за отведённое время
+class PoolTimeout(Exception):
+    pass
+
+
+# Потокобезопасный пул соединений.
+# - Не больше maxsize соединений; они создаются по мере надобности.
+# - Если все соединения заняты, поток ждёт не дольше timeout секунд.
+# - Перед выдачей закрытое соединение заменяется новым, а долго
+#   простаивавшее проверяется запросом SELECT 1.
+# - После использования незавершённая транзакция откатывается.
+class ConnectionPool:
+    def __init__(self, maxsize, timeout, check_after):
+        self.maxsize = maxsize
+        self.timeout = timeout
+        self.check_after = check_after
+        self._idle = []  # Свободные соединения: (соединение, время возврата)
+        self._size = 0  # Всего открытых соединений (свободных и выданных)
+        self._condition = threading.Condition()
+        # Метрики
+        self.waiting = 0
+        self.peak_in_use = 0
+        self.checkouts = 0
+        self.timeouts = 0
+        self.discarded = 0  # Соединений, не прошедших проверку
+        self.wait_total = 0.0
+
+    # Берём соединение из пула (ждём, если все заняты)
+    def _acquire(self):
+        started = time.monotonic()
+        deadline = started + self.timeout
+        with self._condition:
+            self.waiting += 1
+            try:
+                while not self._idle and self._size >= self.maxsize:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0 or not self._condition.wait(remaining):
+                        if not self._idle and self._size >= self.maxsize:
+                            self.timeouts += 1
+                            raise PoolTimeout(f'Нет свободного соединения за {self.timeout} с')
+            finally:
+                self.waiting -= 1
+            if self._idle:
+                conn, returned_at = self._idle.pop()
+            else:
+                # Место под новое соединение занимаем сразу, открываем его ниже
+                conn, returned_at = None, None
+                self._size += 1
+            self.peak_in_use = max(self.peak_in_use, self._size - len(self._idle))
+            self.checkouts += 1
+            self.wait_total += time.monotonic() - started
+
+        # Открытие и проверка соединения - вне блокировки
+        try:
+            if conn is not None and not self._is_healthy(conn, returned_at):
+                with self._condition:
+                    self.discarded += 1
+                conn.close()
+                conn = None
+            if conn is None:
+                conn = get_db_connection()
+        except Exception:
+            self._release(None)
+            raise
+        return conn
+
+    def _is_healthy(self, conn, returned_at):
+        if conn.closed:
+            return False
+        if time.monotonic() - returned_at < self.check_after:
+            return True
+        try:
+            with conn.cursor() as cur:
+                cur.execute('SELECT 1')
+            conn.rollback()
+            return True
+        except psycopg2.Error:
+            return False
+
+    # Возвращаем соединение в пул; None - соединение закрыто и место освобождается
+    def _release(self, conn):
+        with self._condition:
+            if conn is None or conn.closed:
+                self._size -= 1
+            else:
+                self._idle.append((conn, time.monotonic()))
+            self._condition.notify()
+
+    # Соединение на время блока with; при ошибке транзакция откатывается
+    @contextmanager
+    def connection(self):
+        conn = self._acquire()
+        try:
+            yield conn
+        finally:
+            try:
+                if not conn.closed:
+                    conn.rollback()
+            except psycopg2.Error:
+                conn.close()
+            self._release(conn)
+
+    # Закрываем все свободные соединения
+    def close(self):
+        with self._condition:
+            for conn, _ in self._idle:
+                conn.close()
+            self._size -= len(self._idle)
+            self._idle = []
+
+    def stats(self):
+        with self._condition:
+            in_use = self._size - len(self._idle)
+            return {
+                'max_size': self.maxsize,
+                'size': self._size,
+                'in_use': in_use,
+                'idle': len(self._idle),
+                'utilization': round(in_use / self.maxsize, 3),
+                'peak_in_use': self.peak_in_use,
+                'waiting': self.waiting,
+                'checkouts': self.checkouts,
+                'timeouts': self.timeouts,
+                'discarded': self.discarded,
+                'avg_wait_ms': round(self.wait_total * 1000 / self.checkouts, 3) if self.checkouts else 0.0
+            }
+
+
+pool = ConnectionPool(DB_POOL_SIZE, DB_POOL_TIMEOUT, DB_POOL_CHECK_AFTER)
+
+
+# Пул исчерпан: сервис перегружен, клиент может повторить запрос позже
+@app.errorhandler(PoolTimeout)
+def handle_pool_timeout(e):
+    return jsonify({'error': str(e)}), 503
+
+
+# Сколько валют можно загрузить одним запросом /load
+MAX_LOAD_ITEMS = 1000
+
+
+# Добавляет валюты одним запросом; уже существующие пропускаются.
+# Возвращает множество добавленных названий.
+def insert_currencies(cur, currencies):
+    rows = execute_values(
+        cur,
+        "INSERT INTO currencies (currency_name, rate) VALUES %s "
+        "ON CONFLICT (currency_name) DO NOTHING RETURNING currency_name",
+        currencies,
+        page_size=MAX_LOAD_ITEMS,
+        fetch=True
+    )
+    return {row[0] for row in rows}
+
+
+# Эндпоинт для добавления новой валюты.
+# Принимает объект {currency_name, rate} или список таких объектов:
+# список добавляется одним запросом в одной транзакции.
 @app.route('/load', methods=['POST'])
 def load_currency():
-    conn = None  # Явно инициализируем переменную
     try:
         # Получаем данные из запроса (название и курс к рублю)
         data = request.get_json()
+
+        if isinstance(data, list):
+            if not data or len(data) > MAX_LOAD_ITEMS:
+                return jsonify({'error': f'Список должен содержать от 1 до {MAX_LOAD_ITEMS} валют'}), 400
+            # Валидация входных данных: при ошибке не добавляется ничего
+            invalid = [
+                index for index, item in enumerate(data)
+                if not isinstance(item, dict) or not item.get('currency_name') or not item.get('rate')
+            ]
+            if invalid:
+                return jsonify({'error': 'Отсутствуют обязательные поля', 'items': invalid}), 400
+
+            currencies = [(item['currency_name'], item['rate']) for item in data]
+            with pool.connection() as conn:
+                inserted = insert_currencies(conn.cursor(), currencies)
+                conn.commit()
+
+            return jsonify({
+                'status': 'OK',
+                'inserted': sorted(inserted),
+                'existing': sorted({name for name, _ in currencies} - inserted)
+            }), 201
+
         currency_name = data.get('currency_name')
         rate = data.get('rate')
 
-        conn = None  # Явно инициализируем переменную
-
         # Валидация входных данных
         if not currency_name or not rate:
             return jsonify({'error': 'Отсутствуют обязательные поля'}), 400
 
-        conn = get_db_connection()  # Устанавливаем соединение с БД
-        cur = conn.cursor()  # Создаём курсор для выполнения SQL-запросов
-
-        # Проверяем существование валюты
-        cur.execute(
-            "SELECT 1 FROM currencies WHERE currency_name = %s",
-            (currency_name,)
-        )
-        if cur.fetchone():
-            return jsonify({'error': 'Валюта уже существует'}), 400
+        with pool.connection() as conn:  # Берём соединение из пула
+            cur = conn.cursor()  # Создаём курсор для выполнения SQL-запросов
 
-        # Добавляем новую валюту
-        cur.execute(
-            "INSERT INTO currencies (currency_name, rate) VALUES (%s, %s)",
-            (currency_name, rate)
-        )
-        conn.commit()
+            # Добавляем валюту; существующую уникальный индекс не даст добавить повторно
+            inserted = insert_currencies(cur, [(currency_name, rate)])
+            conn.commit()
 
+        if not inserted:
+            return jsonify({'error': 'Валюта уже существует'}), 400
         return jsonify({'status': 'OK'}), 201
 
+    except PoolTimeout:
+        raise
     except Exception as e:
         return jsonify({'error': str(e)}), 500
-    finally:
-        if conn is not None:  # Проверяем, было ли создано соединение
-            conn.close()
 
 
 # Эндпоинт для обновления курса валюты
 @app.route('/update_currency', methods=['POST'])
 def update_currency():
-    conn = None
     try:
         # Получаем данные из запроса (название и курс к рублю)
         data = request.get_json()
@@ -76,37 +255,30 @@ def update_currency():
         if not currency_name or not new_rate:
             return jsonify({'error': 'Отсутствуют обязательные поля'}), 400
 
-        conn = get_db_connection()
-        cur = conn.cursor()
+        with pool.connection() as conn:
+            cur = conn.cursor()
 
-        # Проверяем существование валюты
-        cur.execute(
-            "SELECT 1 FROM currencies WHERE currency_name = %s",
-            (currency_name,)
-        )
-        if not cur.fetchone():
-            return jsonify({'error': 'Валюта не найдена'}), 404
-
-        # Обновляем курс
-        cur.execute(
-            "UPDATE currencies SET rate = %s WHERE currency_name = %s",
-            (new_rate, currency_name)
-        )
-        conn.commit()
+            # Обновляем курс; RETURNING показывает, нашлась ли валюта
+            cur.execute(
+                "UPDATE currencies SET rate = %s WHERE currency_name = %s RETURNING id",
+                (new_rate, currency_name)
+            )
+            found = cur.fetchone() is not None
+            conn.commit()
 
+        if not found:
+            return jsonify({'error': 'Валюта не найдена'}), 404
         return jsonify({'status': 'OK'}), 200
 
+    except PoolTimeout:
+        raise
     except Exception as e:
         return jsonify({'error': str(e)}), 500
-    finally:
-        if conn is not None:  # Проверяем, было ли создано соединение
-            conn.close()
 
 
 # Эндпоинт для удаления валюты
 @app.route('/delete', methods=['POST'])
 def delete_currency():
-    conn = None
     try:
         # Ожидает JSON в теле запроса с названием валюты
         data = request.get_json()
@@ -116,44 +288,38 @@ def delete_currency():
         if not currency_name:
             return jsonify({'error': 'Требуется указать название валюты'}), 400
 
-        conn = get_db_connection()
-        cur = conn.cursor()
+        with pool.connection() as conn:
+            cur = conn.cursor()
 
-        # Проверяем существование валюты
-        cur.execute(
-            "SELECT 1 FROM currencies WHERE currency_name = %s",
-            (currency_name,)
-        )
-        if not cur.fetchone():
-            return jsonify({'error': 'Валюта не найдена'}), 404
-
-        # Удаляем валюту
-        cur.execute(
-            "DELETE FROM currencies WHERE currency_name = %s",
-            (currency_name,)
-        )
-        conn.commit()
+            # Удаляем валюту; RETURNING показывает, нашлась ли она
+            cur.execute(
+                "DELETE FROM currencies WHERE currency_name = %s RETURNING id",
+                (currency_name,)
+            )
+            found = cur.fetchone() is not None
+            conn.commit()
 
+        if not found:
+            return jsonify({'error': 'Валюта не найдена'}), 404
         return jsonify({'status': 'OK'}), 200
 
+    except PoolTimeout:
+        raise
     except Exception as e:
         return jsonify({'error': str(e)}), 500
-    finally:
-        if conn is not None:  # Проверяем, было ли создано соединение
-            conn.close()
 
 
 # Эндпоинт для получения валюты по названию
 @app.route("/currencies/<currency_name>", methods=["GET"])
 def get_currency(currency_name):
-    conn = get_db_connection()
-    cur = conn.cursor()
-    cur.execute(
-        "SELECT currency_name, rate FROM currencies WHERE currency_name = %s",
-        (currency_name,)
-    )
-    row = cur.fetchone()  # Получаем одну строку результата
-    conn.close()  # Закрываем соединение
+    # Соединение возвращается в пул и при ошибке запроса
+    with pool.connection() as conn:
+        cur = conn.cursor()
+        cur.execute(
+            "SELECT currency_name, rate FROM currencies WHERE currency_name = %s",
+            (currency_name,)
+        )
+        row = cur.fetchone()  # Получаем одну строку результата
     if row:
         return jsonify({"currency_name": row[0], "rate": float(row[1])})  # Если валюта найдена
     return jsonify({"error": "Валюта не найдена"}), 404  # Если не найдена - 404
@@ -162,16 +328,21 @@ def get_currency(currency_name):
 # Эндпоинт для проверки, является ли пользователь администратором
 @app.route("/is_admin/<chat_id>", methods=["GET"])
 def check_admin(chat_id):
-    conn = get_db_connection()
-    cur = conn.cursor()
+    with pool.connection() as conn:
+        cur = conn.cursor()
 
-    cur.execute("SELECT * FROM admins WHERE chat_id = %s", (chat_id,))
+        cur.execute("SELECT * FROM admins WHERE chat_id = %s", (chat_id,))
 
-    is_admin = cur.fetchone() is not None  # True, если админ найден
-    conn.close()
+        is_admin = cur.fetchone() is not None  # True, если админ найден
     return jsonify({"is_admin": is_admin})
 
 
+# Эндпоинт статистики пула соединений
+@app.route("/stats", methods=["GET"])
+def get_stats():
+    return jsonify(pool.stats())
+
+
 if __name__ == '__main__':
     # Запуск сервер на порту 5001
     app.run(port=5001, debug=True)
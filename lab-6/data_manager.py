@@ -1,5 +1,13 @@
 from flask import Flask, request, jsonify
 import psycopg2
+import os
+import json
+import time
+import select
+import logging
+import threading
+
+logger = logging.getLogger(__name__)
 
 app = Flask(__name__)
 
@@ -18,6 +26,172 @@ def get_db_connection():
     return psycopg2.connect(**DB_CONFIG)
 
 
+# Канал, в который триггер currencies_changed (lab-5/DB.sql) отправляет
+# изменения currencies: JSON с операцией, строкой и временем изменения
+RATES_CHANNEL = 'currencies_changed'
+
+
+# Таблица курсов в памяти процесса.
+# Загружается целиком при старте, а затем обновляется по уведомлениям
+# LISTEN/NOTIFY, поэтому /convert и /currencies не обращаются к базе.
+# Отдельный поток слушает канал; при потере соединения он переподключается
+# и перечитывает таблицу целиком. Читатели получают неизменяемый снимок,
+# который поток подменяет целиком, поэтому блокировки при чтении не нужны.
+class RateCache:
+    def __init__(self, heartbeat=5.0, retry_delay=1.0):
+        self.heartbeat = heartbeat  # Как часто проверять соединение без уведомлений, секунды
+        self.retry_delay = retry_delay
+        self._rows = {}  # id -> (название, курс)
+        self._rates = {}  # название -> курс
+        self._lock = threading.Lock()
+        self._thread = None
+        # Метрики
+        self.connected = False
+        self.synced_at = None  # Когда таблица в памяти последний раз точно совпадала с базой
+        self.events = 0
+        self.reloads = 0
+        self.last_lag = None  # Задержка последнего уведомления от изменения до применения, секунды
+        self.max_lag = 0.0
+
+    # Загружаем таблицу и запускаем поток уведомлений (повторный вызов ничего не делает)
+    def start(self):
+        with self._lock:
+            if self._thread is not None:
+                return
+            conn = self._connect()
+            self._thread = threading.Thread(target=self._listen, args=(conn,), name='rate-cache', daemon=True)
+            self._thread.start()
+
+    # Курс валюты или None, если такой валюты нет
+    def get(self, currency_name):
+        if self._thread is None:
+            self.start()
+        return self._rates.get(currency_name)
+
+    # Все валюты, упорядоченные по названию
+    def items(self):
+        return sorted(self.snapshot().items())
+
+    # Текущий снимок {название: курс}; его не изменяют, поэтому все
+    # значения одного снимка согласованы между собой
+    def snapshot(self):
+        if self._thread is None:
+            self.start()
+        return self._rates
+
+    # Подписываемся на канал и только затем читаем таблицу:
+    # изменения, сделанные во время чтения, придут уведомлениями
+    def _connect(self):
+        conn = get_db_connection()
+        try:
+            conn.autocommit = True
+            with conn.cursor() as cur:
+                cur.execute(f'LISTEN {RATES_CHANNEL}')
+                cur.execute(
+                    "SELECT 1 FROM pg_trigger "
+                    "WHERE tgname = 'currencies_changed' AND tgrelid = 'currencies'::regclass"
+                )
+                if cur.fetchone() is None:
+                    logger.warning("Триггер currencies_changed не найден (lab-5/DB.sql): "
+                                   "изменения курсов не будут приходить")
+            self._load(conn)
+        except Exception:
+            conn.close()
+            raise
+        self.connected = True
+        return conn
+
+    # Читаем таблицу целиком и подменяем снимок
+    def _load(self, conn):
+        with conn.cursor() as cur:
+            cur.execute("SELECT id, currency_name, rate FROM currencies")
+            rows = {row[0]: (row[1], float(row[2])) for row in cur.fetchall()}
+        self._publish(rows)
+        self.reloads += 1
+        self.synced_at = time.time()
+        logger.info(f"Курсы загружены: {len(self._rates)} валют")
+
+    # Подменяем снимок. При одинаковых названиях побеждает строка с меньшим id
+    def _publish(self, rows):
+        rates = {}
+        for row_id in sorted(rows, reverse=True):
+            name, rate = rows[row_id]
+            rates[name] = rate
+        self._rows = rows
+        self._rates = rates
+
+    # Применяем пачку уведомлений к копии таблицы.
+    # Возвращает False, если встретилось непонятное уведомление (например,
+    # NOTIFY currencies_changed, отправленный вручную): таблицу нужно перечитать
+    def _apply(self, notifies):
+        rows = dict(self._rows)
+        now = time.time()
+        for notify in notifies:
+            try:
+                event = json.loads(notify.payload)
+                if event['op'] == 'TRUNCATE':
+                    rows.clear()
+                elif event['op'] == 'DELETE':
+                    rows.pop(event['id'], None)
+                else:
+                    rows[event['id']] = (event['currency_name'], float(event['rate']))
+                lag = max(now - float(event['ts']), 0.0)
+            except (ValueError, KeyError, TypeError) as e:
+                logger.error(f"Непонятное уведомление {notify.payload!r}: {e}")
+                return False
+            self.events += 1
+            self.last_lag = lag
+            self.max_lag = max(self.max_lag, lag)
+        self._publish(rows)
+        return True
+
+    def _listen(self, conn):
+        while True:
+            try:
+                # Ждём уведомлений; в тишине проверяем, что соединение живо
+                if select.select([conn], [], [], self.heartbeat) == ([], [], []):
+                    with conn.cursor() as cur:
+                        cur.execute("SELECT 1")
+                conn.poll()
+                if conn.notifies:
+                    notifies = list(conn.notifies)
+                    conn.notifies.clear()
+                    if not self._apply(notifies):
+                        self._load(conn)
+                self.synced_at = time.time()
+            except Exception as e:
+                # Поток не должен завершаться: пока соединения нет, отвечаем
+                # по последнему снимку, переподключаемся и перечитываем таблицу
+                self.connected = False
+                logger.error(f"Соединение для уведомлений о курсах потеряно: {e}")
+                conn.close()
+                conn = self._reconnect()
+
+    def _reconnect(self):
+        while True:
+            time.sleep(self.retry_delay)
+            try:
+                return self._connect()
+            except Exception as e:
+                logger.error(f"Не удалось переподключиться: {e}")
+
+    # Устаревание: сколько секунд назад таблица в памяти точно совпадала с базой.
+    # Пока соединение живо, значение не превышает интервал проверки heartbeat.
+    def stats(self):
+        return {
+            'currencies': len(self._rates),
+            'connected': self.connected,
+            'staleness_seconds': round(time.time() - self.synced_at, 3) if self.synced_at else None,
+            'events': self.events,
+            'reloads': self.reloads,
+            'last_event_lag_ms': round(self.last_lag * 1000, 1) if self.last_lag is not None else None,
+            'max_event_lag_ms': round(self.max_lag * 1000, 1)
+        }
+
+
+rate_cache = RateCache()
+
+
 # Эндпоинт для конвертации валюты
 @app.route('/convert', methods=['GET'])
 def convert_currency():
@@ -36,35 +210,79 @@ def convert_currency():
         except ValueError:
             return jsonify({'error': 'Сумма должна быть положительным числом'}), 400
 
-        conn = None
-        try:
-            conn = get_db_connection()
-            with conn.cursor() as cur:
-                # Получаем курс валюты
-                cur.execute(
-                    "SELECT rate FROM currencies WHERE currency_name = %s",
-                    (currency_name.upper(),)
-                )
-                row = cur.fetchone()
+        # Курс берём из таблицы в памяти
+        rate = rate_cache.get(currency_name.upper())
+        if rate is None:
+            return jsonify({'error': 'Валюта не найдена'}), 404
 
-                if not row:
-                    return jsonify({'error': 'Валюта не найдена'}), 404
+        converted_amount = amount * rate
 
-                rate = float(row[0])
-                converted_amount = amount * rate
+        return jsonify({
+            'original_amount': amount,
+            'currency': currency_name.upper(),
+            'converted_amount': converted_amount,
+            'rate': rate
+        }), 200
 
-                return jsonify({
-                    'original_amount': amount,
-                    'currency': currency_name.upper(),
-                    'converted_amount': converted_amount,
-                    'rate': rate
-                }), 200
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
 
-        except Exception as e:
-            return jsonify({'error': str(e)}), 500
-        finally:
-            if conn is not None:  # Проверяем, было ли создано соединение
-                conn.close()
+
+# Сколько элементов можно конвертировать одним запросом /convert/batch
+MAX_BATCH_ITEMS = 1000
+
+
+# Проверяет один элемент пакета; возвращает (название, сумма) или текст ошибки
+def parse_batch_item(item):
+    if not isinstance(item, dict):
+        return 'Элемент должен быть объектом'
+    currency_name = item.get('currency_name')
+    amount = item.get('amount')
+    if not isinstance(currency_name, str) or not currency_name or amount is None or isinstance(amount, bool):
+        return 'Отсутствуют обязательные параметры'
+    try:
+        amount = float(amount)
+        if not amount > 0 or amount == float('inf'):
+            raise ValueError
+    except (TypeError, ValueError):
+        return 'Сумма должна быть положительным числом'
+    return currency_name.upper(), amount
+
+
+# Эндпоинт для пакетной конвертации: принимает массив {currency_name, amount}.
+# Все курсы берутся из одного снимка таблицы в памяти, поэтому пакет
+# конвертируется по согласованным курсам. Ошибка в элементе не отменяет
+# остальные: для него в ответе на той же позиции возвращается error.
+@app.route('/convert/batch', methods=['POST'])
+def convert_batch():
+    try:
+        items = request.get_json(silent=True)
+        if not isinstance(items, list):
+            return jsonify({'error': 'Ожидается массив элементов {currency_name, amount}'}), 400
+        if len(items) > MAX_BATCH_ITEMS:
+            return jsonify({'error': f'Не больше {MAX_BATCH_ITEMS} элементов за запрос'}), 400
+
+        rates = rate_cache.snapshot()
+        parsed = [parse_batch_item(item) for item in items]
+        results = []
+        for entry in parsed:
+            if isinstance(entry, str):
+                results.append({'error': entry})
+                continue
+            currency, amount = entry
+            rate = rates.get(currency)
+            if rate is None:
+                results.append({'currency': currency, 'error': 'Валюта не найдена'})
+                continue
+            results.append({
+                'original_amount': amount,
+                'currency': currency,
+                'converted_amount': amount * rate,
+                'rate': rate
+            })
+
+        errors = sum(1 for result in results if 'error' in result)
+        return jsonify({'results': results, 'errors': errors}), 200
 
     except Exception as e:
         return jsonify({'error': str(e)}), 500
@@ -73,22 +291,26 @@ def convert_currency():
 # Эндпоинт для получения списка всех валют
 @app.route('/currencies', methods=['GET'])
 def get_all_currencies():
-    conn = None
     try:
-        conn = get_db_connection()
-        with conn.cursor() as cur:
-            cur.execute("SELECT currency_name, rate FROM currencies ORDER BY currency_name")
-            currencies = [
-                {'currency_name': row[0], 'rate': float(row[1])}
-                for row in cur.fetchall()
-            ]
-            return jsonify(currencies), 200
+        currencies = [
+            {'currency_name': name, 'rate': rate}
+            for name, rate in rate_cache.items()
+        ]
+        return jsonify(currencies), 200
     except Exception as e:
         return jsonify({'error': str(e)}), 500
-    finally:
-        if conn is not None:
-            conn.close()
+
+
+# Эндпоинт состояния таблицы курсов в памяти (в том числе устаревание)
+@app.route('/stats', methods=['GET'])
+def get_stats():
+    return jsonify(rate_cache.stats()), 200
 
 
 if __name__ == '__main__':
+    logging.basicConfig(level=logging.INFO)
+    # С debug=True модуль выполняется ещё и в процессе-наблюдателе перезагрузчика;
+    # курсы загружаем только в процессе, который обслуживает запросы
+    if os.environ.get('WERKZEUG_RUN_MAIN') == 'true':
+        rate_cache.start()
     app.run(port=5002, debug=True)
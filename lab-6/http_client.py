@@ -0,0 +1,20 @@
+import os  # Работа с переменными окружения
+import aiohttp  # Асинхронные HTTP-запросы
+
+# Параметры HTTP-клиента для запросов к микросервисам
+HTTP_LIMIT_PER_HOST = int(os.getenv("HTTP_LIMIT_PER_HOST", "20"))  # Соединений к одному сервису
+HTTP_KEEPALIVE_TIMEOUT = float(os.getenv("HTTP_KEEPALIVE_TIMEOUT", "30"))  # Простой соединения, секунды
+HTTP_CONNECT_TIMEOUT = float(os.getenv("HTTP_CONNECT_TIMEOUT", "2"))  # Установка соединения, секунды
+HTTP_TOTAL_TIMEOUT = float(os.getenv("HTTP_TOTAL_TIMEOUT", "5"))  # Весь запрос, секунды
+
+
+# Создание HTTP-сессии: соединения с микросервисами остаются открытыми
+# и переиспользуются, поэтому шаг диалога не тратит время на новое TCP-соединение.
+# Сессию нужно создавать внутри работающего цикла событий и закрывать при остановке.
+def create_http_session() -> aiohttp.ClientSession:
+    connector = aiohttp.TCPConnector(
+        limit_per_host=HTTP_LIMIT_PER_HOST,
+        keepalive_timeout=HTTP_KEEPALIVE_TIMEOUT
+    )
+    timeout = aiohttp.ClientTimeout(total=HTTP_TOTAL_TIMEOUT, connect=HTTP_CONNECT_TIMEOUT)
+    return aiohttp.ClientSession(connector=connector, timeout=timeout)
@@ -6,7 +6,8 @@ from aiogram.filters import Command  # Фильтр для команд
 from aiogram.fsm.context import FSMContext  # Контекст для управления состояниями
 from aiogram.fsm.state import State, StatesGroup  # Определение состояний FSM
 from aiogram.utils.keyboard import ReplyKeyboardBuilder  # Создание клавиатур
-import aiohttp  # Асинхронные HTTP-запросы
+from http_client import create_http_session  # Общий HTTP-клиент с постоянными соединениями
+from sqlite_storage import SQLiteStorage  # Постоянное хранилище состояний FSM
 
 # Настройка логирования
 logging.basicConfig(level=logging.INFO)
@@ -17,12 +18,30 @@ API_TOKEN = os.getenv("API_TOKEN")
 
 # Создание экземпляров бота и диспетчера
 bot = Bot(token=API_TOKEN)
-dp = Dispatcher()
+# Состояния FSM хранятся в SQLite: незавершённые диалоги переживают перезапуск
+dp = Dispatcher(storage=SQLiteStorage(os.getenv("FSM_STORAGE_PATH", "fsm.sqlite3")))
 
 # URL-адреса микросервисов для управления валютами и получения данных
 CURRENCY_MANAGER_URL = "http://127.0.0.1:5001"
 DATA_MANAGER_URL = "http://127.0.0.1:5002"
 
+# Общая HTTP-сессия для запросов к микросервисам (создаётся при запуске бота)
+http_session = None
+
+
+# Открываем HTTP-сессию при запуске бота
+@dp.startup()
+async def on_startup():
+    global http_session
+    http_session = create_http_session()
+
+
+# Закрываем HTTP-сессию при остановке бота
+@dp.shutdown()
+async def on_shutdown():
+    if http_session is not None:
+        await http_session.close()
+
 
 # Определение состояний для управления валютами
 class CurrencyStates(StatesGroup):
@@ -37,16 +56,15 @@ class CurrencyStates(StatesGroup):
 
 # Функция для проверки, является ли пользователь администратором
 async def is_admin(chat_id: int) -> bool:
-    async with aiohttp.ClientSession() as session:
-        try:
-            # Отправка GET-запроса для проверки статуса администратора
-            async with session.get(f"{CURRENCY_MANAGER_URL}/is_admin/{chat_id}") as resp:
-                if resp.status == 200:
-                    data = await resp.json()
-                    # Возвращаем значение is_admin из ответа (по умолчанию False)
-                    return data.get("is_admin", False)
-        except Exception as e:
-            logger.error(f"Ошибка при проверке администратора: {e}")
+    try:
+        # Отправка GET-запроса для проверки статуса администратора
+        async with http_session.get(f"{CURRENCY_MANAGER_URL}/is_admin/{chat_id}") as resp:
+            if resp.status == 200:
+                data = await resp.json()
+                # Возвращаем значение is_admin из ответа (по умолчанию False)
+                return data.get("is_admin", False)
+    except Exception as e:
+        logger.error(f"Ошибка при проверке администратора: {e}")
     # Возвращаем False, если статус не 200
     return False
 
@@ -156,18 +174,17 @@ async def add_currency_name(message: types.Message, state: FSMContext):
         return
 
     # Проверка, существует ли уже такая валюта
-    async with aiohttp.ClientSession() as session:
-        try:
-            async with session.get(f"{CURRENCY_MANAGER_URL}/currencies/{currency_name}") as resp:
-                if resp.status == 200:
-                    await message.answer("Данная валюта уже существует")
-                    await state.clear()
-                    return
-        except Exception as e:
-            logger.error(f"Ошибка при проверке валюты: {e}")
-            await message.answer("Произошла ошибка, попробуйте позже")
-            await state.clear()
-            return
+    try:
+        async with http_session.get(f"{CURRENCY_MANAGER_URL}/currencies/{currency_name}") as resp:
+            if resp.status == 200:
+                await message.answer("Данная валюта уже существует")
+                await state.clear()
+                return
+    except Exception as e:
+        logger.error(f"Ошибка при проверке валюты: {e}")
+        await message.answer("Произошла ошибка, попробуйте позже")
+        await state.clear()
+        return
 
     # Сохранение названия валюты в состоянии
     await state.update_data(currency_name=currency_name)
@@ -194,20 +211,19 @@ async def add_currency_rate(message: types.Message, state: FSMContext):
     currency_name = data['currency_name']
 
     # Отправка запроса на добавление новой валюты
-    async with aiohttp.ClientSession() as session:
-        try:
-            async with session.post(
-                    f"{CURRENCY_MANAGER_URL}/load",
-                    json={"currency_name": currency_name, "rate": rate}
-            ) as resp:
-                if resp.status == 201:
-                    await message.answer(f"✅ Валюта {currency_name} успешно добавлена")
-                else:
-                    error = await resp.text()
-                    await message.answer(f"❌ Ошибка при добавлении валюты: {error}")
-        except Exception as e:
-            logger.error(f"Ошибка при добавлении валюты: {e}")
-            await message.answer("Произошла ошибка, попробуйте позже")
+    try:
+        async with http_session.post(
+                f"{CURRENCY_MANAGER_URL}/load",
+                json={"currency_name": currency_name, "rate": rate}
+        ) as resp:
+            if resp.status == 201:
+                await message.answer(f"✅ Валюта {currency_name} успешно добавлена")
+            else:
+                error = await resp.text()
+                await message.answer(f"❌ Ошибка при добавлении валюты: {error}")
+    except Exception as e:
+        logger.error(f"Ошибка при добавлении валюты: {e}")
+        await message.answer("Произошла ошибка, попробуйте позже")
     # Очистка состояния
     await state.clear()
 
@@ -235,22 +251,21 @@ async def delete_currency(message: types.Message, state: FSMContext):
     currency_name = message.text.upper().strip()
 
     # Отправка запроса на удаление валюты
-    async with aiohttp.ClientSession() as session:
-        try:
-            async with session.post(
-                    f"{CURRENCY_MANAGER_URL}/delete",
-                    json={"currency_name": currency_name}
-            ) as resp:
-                if resp.status == 200:
-                    await message.answer(f"✅ Валюта {currency_name} успешно удалена")
-                elif resp.status == 404:
-                    await message.answer(f"❌ Валюта {currency_name} не найдена")
-                else:
-                    error = await resp.text()
-                    await message.answer(f"❌ Ошибка при удалении валюты: {error}")
-        except Exception as e:
-            logger.error(f"Ошибка при удалении валюты: {e}")
-            await message.answer("Произошла ошибка, попробуйте позже")
+    try:
+        async with http_session.post(
+                f"{CURRENCY_MANAGER_URL}/delete",
+                json={"currency_name": currency_name}
+        ) as resp:
+            if resp.status == 200:
+                await message.answer(f"✅ Валюта {currency_name} успешно удалена")
+            elif resp.status == 404:
+                await message.answer(f"❌ Валюта {currency_name} не найдена")
+            else:
+                error = await resp.text()
+                await message.answer(f"❌ Ошибка при удалении валюты: {error}")
+    except Exception as e:
+        logger.error(f"Ошибка при удалении валюты: {e}")
+        await message.answer("Произошла ошибка, попробуйте позже")
     await state.clear()
 
 
@@ -273,18 +288,17 @@ async def update_currency_name(message: types.Message, state: FSMContext):
     currency_name = message.text.upper().strip()
 
     # Проверка, существует ли уже такая валюта
-    async with aiohttp.ClientSession() as session:
-        try:
-            async with session.get(f"{CURRENCY_MANAGER_URL}/currencies/{currency_name}") as resp:
-                if resp.status != 200:
-                    await message.answer(f"❌ Валюта {currency_name} не найдена")
-                    await state.clear()
-                    return
-        except Exception as e:
-            logger.error(f"Ошибка при проверке валюты: {e}")
-            await message.answer("Произошла ошибка, попробуйте позже")
-            await state.clear()
-            return
+    try:
+        async with http_session.get(f"{CURRENCY_MANAGER_URL}/currencies/{currency_name}") as resp:
+            if resp.status != 200:
+                await message.answer(f"❌ Валюта {currency_name} не найдена")
+                await state.clear()
+                return
+    except Exception as e:
+        logger.error(f"Ошибка при проверке валюты: {e}")
+        await message.answer("Произошла ошибка, попробуйте позже")
+        await state.clear()
+        return
 
     await state.update_data(currency_name=currency_name)
     await message.answer("Введите новый курс валюты:")
@@ -306,50 +320,48 @@ async def update_currency_rate(message: types.Message, state: FSMContext):
     currency_name = data['currency_name']
 
     # Пробуем изменить курс валюты в БД
-    async with aiohttp.ClientSession() as session:
-        try:
-            new_rate = {"currency_name": currency_name, "rate": rate}
-            async with session.post(
-                f"{CURRENCY_MANAGER_URL}/update_currency",
-                json=new_rate
-            ) as resp:
-                if resp.status == 200:
-                    await message.answer(
-                        f"✅ Курс валюты {currency_name} успешно обновлен")
-                elif resp.status == 404:
-                    await message.answer(f"❌ Валюта {currency_name} не найдена")
-                else:
-                    error = await resp.text()
-                    await message.answer(f"❌ Ошибка при обновлении курса: {error}")
-        except Exception as e:
-            logger.error(f"Ошибка при обновлении курса: {e}")
-            await message.answer("Произошла ошибка, попробуйте позже")
+    try:
+        new_rate = {"currency_name": currency_name, "rate": rate}
+        async with http_session.post(
+            f"{CURRENCY_MANAGER_URL}/update_currency",
+            json=new_rate
+        ) as resp:
+            if resp.status == 200:
+                await message.answer(
+                    f"✅ Курс валюты {currency_name} успешно обновлен")
+            elif resp.status == 404:
+                await message.answer(f"❌ Валюта {currency_name} не найдена")
+            else:
+                error = await resp.text()
+                await message.answer(f"❌ Ошибка при обновлении курса: {error}")
+    except Exception as e:
+        logger.error(f"Ошибка при обновлении курса: {e}")
+        await message.answer("Произошла ошибка, попробуйте позже")
     await state.clear()
 
 
 # Обработчик команды /get_currencies
 @dp.message(Command("get_currencies"))
 async def get_currencies(message: types.Message):
-    async with aiohttp.ClientSession() as session:
-        try:
-            # Запрашиваем список всех существующих валют
-            async with session.get(f"{DATA_MANAGER_URL}/currencies") as resp:
-                if resp.status == 200:
-                    currencies_list = await resp.json()
-                    if currencies_list:
-                        # Форматируем валюты в читаемый вид
-                        response = "Список доступных валют:\n\n"
-                        for curr in currencies_list:
-                            response += f"{curr['currency_name']} - {curr['rate']} руб.\n"
-                        await message.answer(response)
-                    else:
-                        await message.answer("Список валют пуст")
+    try:
+        # Запрашиваем список всех существующих валют
+        async with http_session.get(f"{DATA_MANAGER_URL}/currencies") as resp:
+            if resp.status == 200:
+                currencies_list = await resp.json()
+                if currencies_list:
+                    # Форматируем валюты в читаемый вид
+                    response = "Список доступных валют:\n\n"
+                    for curr in currencies_list:
+                        response += f"{curr['currency_name']} - {curr['rate']} руб.\n"
+                    await message.answer(response)
                 else:
-                    error = await resp.text()
-                    await message.answer(f"Ошибка сервера: {error}")
-        except Exception as e:
-            logger.error(f"Ошибка при получении валют: {e}")
-            await message.answer("Произошла ошибка, попробуйте позже")
+                    await message.answer("Список валют пуст")
+            else:
+                error = await resp.text()
+                await message.answer(f"Ошибка сервера: {error}")
+    except Exception as e:
+        logger.error(f"Ошибка при получении валют: {e}")
+        await message.answer("Произошла ошибка, попробуйте позже")
 
 
 # Обработчик команды /convert
@@ -365,18 +377,17 @@ async def convert_currency_name(message: types.Message, state: FSMContext):
     currency_name = message.text.upper().strip()
 
     # Проверка, существует ли уже такая валюта
-    async with aiohttp.ClientSession() as session:
-        try:
-            async with session.get(f"{CURRENCY_MANAGER_URL}/currencies/{currency_name}") as resp:
-                if resp.status != 200:
-                    await message.answer(f"❌ Валюта {currency_name} не найдена")
-                    await state.clear()
-                    return
-        except Exception as e:
-            logger.error(f"Ошибка при проверке валюты: {e}")
-            await message.answer("Произошла ошибка, попробуйте позже")
-            await state.clear()
-            return
+    try:
+        async with http_session.get(f"{CURRENCY_MANAGER_URL}/currencies/{currency_name}") as resp:
+            if resp.status != 200:
+                await message.answer(f"❌ Валюта {currency_name} не найдена")
+                await state.clear()
+                return
+    except Exception as e:
+        logger.error(f"Ошибка при проверке валюты: {e}")
+        await message.answer("Произошла ошибка, попробуйте позже")
+        await state.clear()
+        return
 
     await state.update_data(currency_name=currency_name)
     await message.answer("Введите сумму в этой валюте:")
@@ -397,36 +408,39 @@ async def convert_amount(message: types.Message, state: FSMContext):
     data = await state.get_data()
     currency_name = data['currency_name']
 
-    async with aiohttp.ClientSession() as session:
-        try:
-            # Отправляем запрос на конвертацию
-            async with session.get(
-                    f"{DATA_MANAGER_URL}/convert",
-                    params={"currency_name": currency_name, "amount": amount}
-            ) as resp:
-                if resp.status == 200:
-                    result = await resp.json()
-                    converted = result.get('converted_amount')
-                    rate = result.get('rate')
-                    await message.answer(
-                        f" {amount} {currency_name} = {converted} RUB\n"
-                        f"Курс: 1 {currency_name} = {rate} RUB"
-                    )
-                elif resp.status == 404:
-                    await message.answer(f"❌ Валюта {currency_name} не найдена")
-                else:
-                    error = await resp.text()
-                    await message.answer(f"❌ Ошибка конвертации: {error}")
-        except Exception as e:
-            logger.error(f"Ошибка при конвертации: {e}")
-            await message.answer("Произошла ошибка, попробуйте позже")
+    try:
+        # Отправляем запрос на конвертацию
+        async with http_session.get(
+                f"{DATA_MANAGER_URL}/convert",
+                params={"currency_name": currency_name, "amount": amount}
+        ) as resp:
+            if resp.status == 200:
+                result = await resp.json()
+                converted = result.get('converted_amount')
+                rate = result.get('rate')
+                await message.answer(
+                    f" {amount} {currency_name} = {converted} RUB\n"
+                    f"Курс: 1 {currency_name} = {rate} RUB"
+                )
+            elif resp.status == 404:
+                await message.answer(f"❌ Валюта {currency_name} не найдена")
+            else:
+                error = await resp.text()
+                await message.answer(f"❌ Ошибка конвертации: {error}")
+    except Exception as e:
+        logger.error(f"Ошибка при конвертации: {e}")
+        await message.answer("Произошла ошибка, попробуйте позже")
     await state.clear()
 
 
 # Основная асинхронная функция для запуска бота
 async def main():
-    # Запускаем бесконечный цикл опроса серверов на новые сообщения
-    await dp.start_polling(bot)
+    try:
+        # Запускаем бесконечный цикл опроса серверов на новые сообщения
+        await dp.start_polling(bot)
+    finally:
+        # Дописываем накопленные изменения состояний
+        await dp.storage.close()
 
 
 if __name__ == "__main__":
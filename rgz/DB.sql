@@ -16,3 +16,6 @@ CREATE TABLE operations (
     created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,  -- Дата создания записи
     FOREIGN KEY (chat_id) REFERENCES users(chat_id) ON DELETE CASCADE
 );
+
+-- Индексы и дальнейшие изменения схемы применяются миграциями
+-- из каталога migrations: python migrate.py
@@ -0,0 +1,58 @@
+import sys # Для чтения аргументов командной строки
+import time # Для замера задержек
+import asyncio # Для одновременных запросов
+import aiohttp # Асинхронный HTTP-клиент
+
+# Сколько запросов отправить и сколько из них выполнять одновременно
+REQUESTS = 5000
+CONCURRENCY = 50
+
+
+# Перцентиль по отсортированному списку
+def percentile(values: list, p: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * p / 100))]
+
+
+# Отправляем REQUESTS запросов /rate с CONCURRENCY одновременными клиентами.
+# Клиенты используют общую сессию с keep-alive, как бот.
+async def benchmark(base_url: str):
+    latencies = []
+    errors = 0
+    counter = iter(range(REQUESTS))
+
+    async def client(session):
+        nonlocal errors
+        for i in counter:
+            currency = "USD" if i % 2 else "EUR"
+            started = time.perf_counter()
+            try:
+                async with session.get(f"{base_url}/rate", params={"currency": currency}) as response:
+                    await response.read()
+                    if response.status != 200:
+                        errors += 1
+            except aiohttp.ClientError:
+                errors += 1
+            latencies.append(time.perf_counter() - started)
+
+    connector = aiohttp.TCPConnector(limit=CONCURRENCY)
+    async with aiohttp.ClientSession(connector=connector) as session:
+        started = time.perf_counter()
+        await asyncio.gather(*(client(session) for _ in range(CONCURRENCY)))
+        elapsed = time.perf_counter() - started
+
+    print(f"{base_url}: {REQUESTS / elapsed:.0f} запросов/с, ошибок: {errors}, "
+          f"p50 {percentile(latencies, 50) * 1000:.2f} мс, "
+          f"p95 {percentile(latencies, 95) * 1000:.2f} мс, "
+          f"p99 {percentile(latencies, 99) * 1000:.2f} мс")
+
+
+if __name__ == '__main__':
+    # Использование: python bench_exchange_service.py [URL ...]
+    # Например, сервер разработки и производственный режим на соседних портах:
+    #   python exchange_service.py
+    #   EXCHANGE_SERVICE_PORT=5001 python exchange_asgi.py
+    #   python bench_exchange_service.py http://127.0.0.1:5000 http://127.0.0.1:5001
+    urls = sys.argv[1:] or ["http://127.0.0.1:5000", "http://127.0.0.1:5001"]
+    for url in urls:
+        asyncio.run(benchmark(url))
@@ -0,0 +1,54 @@
+import random # Для генерации тестовых операций
+import timeit # Для замера времени
+from datetime import date, timedelta # Даты операций
+from decimal import Decimal # Суммы как в колонке DECIMAL(10, 2)
+from formatting import convert_amounts, format_operations
+
+# Количество операций и повторов замера
+ROWS = 5000
+REPEAT = 20
+
+
+# Прежний способ: пересчёт и форматирование каждой строки в цикле
+def format_operations_loop(rows, currency: str, rate: float) -> str:
+    lines = []
+    for _, op_date, amount, op_type in rows:
+        converted_amount = round(float(amount) / rate, 2)
+
+        lines.append(
+            f"{op_date.strftime('%d.%m.%Y')} - "
+            f"{converted_amount} {currency} - "
+            f"{op_type}"
+        )
+    return "\n".join(lines)
+
+
+# Синтетические операции одного пользователя
+def generate_rows(count: int) -> list:
+    random.seed(1)
+    start = date(2020, 1, 1)
+    return [
+        (
+            i,
+            start + timedelta(days=random.randrange(2000)),
+            Decimal(random.randrange(1, 10_000_000)) / 100,
+            random.choice(("ДОХОД", "РАСХОД"))
+        )
+        for i in range(count)
+    ]
+
+
+if __name__ == "__main__":
+    rows = generate_rows(ROWS)
+    rate = 90.11
+
+    # Проверяем точность: сравниваем с делением Decimal и округлением половины вверх
+    exact = [
+        str((amount / Decimal(str(rate))).quantize(Decimal("0.01"), rounding="ROUND_HALF_UP"))
+        for _, _, amount, _ in rows
+    ]
+    assert convert_amounts([row[2] for row in rows], rate) == exact
+
+    for name, func in (("цикл", format_operations_loop), ("пакетно", format_operations)):
+        seconds = min(timeit.repeat(lambda: func(rows, "EUR", rate), number=1, repeat=REPEAT))
+        print(f"{name:8} {ROWS} строк: {seconds * 1000:.2f} мс")
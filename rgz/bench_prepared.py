@@ -0,0 +1,75 @@
+import sys # Для чтения аргументов командной строки
+import json # Для разбора плана запроса
+import time # Для замера времени
+import psycopg2 # Для работы с PostgreSQL
+from db import DB_CONFIG, SORT_COLUMNS, SORT_DIRECTIONS, operations_page_query, operations_page_statement, statements
+from statements import PreparedConnection
+
+# Сколько раз выполняется каждый вариант запроса
+REPEAT = 500
+# Первые выполнения подготовленного запроса планируются заново (custom plan);
+# общий план сервер выбирает только после пяти выполнений
+WARMUP = 10
+
+
+# Время планирования из EXPLAIN ANALYZE, миллисекунды
+def planning_time(cursor, query: str, params: dict) -> float:
+    cursor.execute("EXPLAIN (ANALYZE, FORMAT JSON) " + query, params)
+    plan = cursor.fetchone()[0]
+    if isinstance(plan, str):
+        plan = json.loads(plan)
+    return plan[0]["Planning Time"]
+
+
+# Среднее время одного вызова, миллисекунды
+def average_ms(func) -> float:
+    started = time.perf_counter()
+    for _ in range(REPEAT):
+        func()
+    return (time.perf_counter() - started) * 1000 / REPEAT
+
+
+# Сравниваем первую страницу /operations для шести вариантов сортировки:
+# текст запроса каждый раз (как раньше) и EXECUTE подготовленного запроса
+def bench(conn, chat_id: int):
+    params = {"chat_id": chat_id, "limit": 21}
+    total_plain = total_prepared = 0.0
+    with conn.cursor() as cursor:
+        for column in SORT_COLUMNS:
+            for direction in SORT_DIRECTIONS:
+                query = operations_page_query(column, direction)
+                name = operations_page_statement(column, direction)
+                for _ in range(WARMUP):
+                    statements.execute(cursor, name, params)
+                    cursor.fetchall()
+
+                def run_plain():
+                    cursor.execute(query, params)
+                    cursor.fetchall()
+
+                def run_prepared():
+                    statements.execute(cursor, name, params)
+                    cursor.fetchall()
+
+                plain_ms = average_ms(run_plain)
+                prepared_ms = average_ms(run_prepared)
+                plain_planning = planning_time(cursor, query, params)
+                prepared_planning = planning_time(cursor, statements.execute_text(name), params)
+                total_plain += plain_ms
+                total_prepared += prepared_ms
+                print(f"{column:14} {direction:4}: запрос {plain_ms:.3f} мс -> {prepared_ms:.3f} мс, "
+                      f"планирование {plain_planning:.3f} мс -> {prepared_planning:.3f} мс")
+    conn.rollback()
+    print(f"Итого на шесть вариантов: {total_plain:.3f} мс -> {total_prepared:.3f} мс, "
+          f"сэкономлено {total_plain - total_prepared:.3f} мс")
+
+
+if __name__ == "__main__":
+    # Использование: python bench_prepared.py <chat_id>
+    # Для наглядности используйте пользователя с большим числом операций
+    # (например, загруженного через load_test.py или /import).
+    connection = psycopg2.connect(connection_factory=PreparedConnection, **DB_CONFIG)
+    try:
+        bench(connection, int(sys.argv[1]) if len(sys.argv) > 1 else 0)
+    finally:
+        connection.close()
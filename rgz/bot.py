@@ -1,12 +1,26 @@
 import os # Для доступа к переменным окружения
+import asyncio # Для объединения одновременных запросов курса
 import logging # Для записи событий (логирования)
 from datetime import datetime # Работа с датами и временем
+from decimal import Decimal, InvalidOperation, ROUND_HALF_UP # Точные суммы операций
 from aiogram import Bot, Dispatcher, types, F # Основные компоненты для бота
-from aiogram.filters import Command # Фильтр для обработки команд
+from aiogram.filters import Command, CommandObject # Фильтр для обработки команд и их аргументы
+from aiogram.filters.callback_data import CallbackData # Данные inline-кнопок
 from aiogram.fsm.context import FSMContext # Для хранения промежуточных данных
 from aiogram.fsm.state import State, StatesGroup # Базовые классы для создания состояний
+from aiogram.utils.keyboard import InlineKeyboardBuilder # Для создания inline-клавиатур
 import psycopg2 # Для работы с PostgreSQL
 import aiohttp # Асинхронный HTTP-клиент для запросов к внешним API
+from db import db, statements, operations_page_statement # Пул соединений и запросы к базе данных
+from db import is_valid_operation_date, PartitionLimitError # Допустимые даты и лимит новых секций
+from cache import TTLCache, MISSING # Кэш в памяти процесса
+from importer import parse_statement, load_statement, MAX_SUM # Импорт операций из выписки
+from write_queue import OperationWriteQueue # Пакетная запись операций
+from formatting import format_operations # Пересчёт и вывод списка операций
+from sqlite_storage import SQLiteStorage # Постоянное хранилище состояний FSM
+from outbound import OutboundScheduler # Планировщик исходящих запросов к Telegram
+from export import export_operations, EXPORT_FORMATS # Выгрузка операций в файл
+from partitions import add_months # Секции operations на месяцы вперёд
 
 # Настройка логирования: выводится информация в консоль
 logging.basicConfig(level=logging.INFO)
@@ -17,19 +31,76 @@ API_TOKEN = os.getenv("API_TOKEN")
 
 # Создаём экземпляр бота
 bot = Bot(token=API_TOKEN)
-# Создаём диспетчер (обработчик команд)
-dp = Dispatcher()
-
-
-# Функция для подключения к базе данных
-def get_db_connection():
-    return psycopg2.connect(
-        host="localhost",
-        port=5432,
-        database="rpp_rgz",
-        user="postgres",
-        password="postgres"
-    )
+# Все исходящие запросы проходят через планировщик с лимитами Telegram
+outbound = OutboundScheduler(
+    global_rate=float(os.getenv("OUTBOUND_GLOBAL_RATE", "30")),  # сообщений в секунду на бота
+    chat_rate=float(os.getenv("OUTBOUND_CHAT_RATE", "1")),  # сообщений в секунду на чат
+    chat_burst=float(os.getenv("OUTBOUND_CHAT_BURST", "3"))  # сообщений подряд в чат без ожидания
+)
+bot.session.middleware(outbound)
+# Создаём диспетчер (обработчик команд) с постоянным хранилищем состояний:
+# незавершённые диалоги переживают перезапуск, файл можно разделить между процессами
+dp = Dispatcher(storage=SQLiteStorage(os.getenv("FSM_STORAGE_PATH", "fsm.sqlite3")))
+
+# Очередь пакетной записи операций. OPERATIONS_BATCH_DELAY_MS - сколько ждать
+# других операций перед commit (0 - минимальная задержка, больше - выше пропускная способность)
+write_queue = OperationWriteQueue(
+    db,
+    max_batch=int(os.getenv("OPERATIONS_BATCH_SIZE", "100")),
+    max_delay=float(os.getenv("OPERATIONS_BATCH_DELAY_MS", "10")) / 1000
+)
+
+
+# На сколько месяцев вперёд создавать секции operations при запуске
+PARTITIONS_AHEAD = int(os.getenv("PARTITIONS_AHEAD", "3"))
+
+
+# Открываем пул соединений с БД при запуске бота
+@dp.startup()
+async def on_startup():
+    global http_session
+    db.start()
+    logger.info(f"Пул соединений с БД открыт (от {db.minconn} до {db.maxconn})")
+    # Заранее создаём секции operations на текущий и следующие месяцы
+    month = datetime.now().date().replace(day=1)
+    await db.ensure_partitions([add_months(month, i) for i in range(PARTITIONS_AHEAD + 1)])
+    write_queue.start()
+    # Одна HTTP-сессия на всё время работы бота (соединения переиспользуются)
+    http_session = aiohttp.ClientSession(timeout=aiohttp.ClientTimeout(total=5.0))
+
+
+# Закрываем пул соединений с БД при остановке бота
+@dp.shutdown()
+async def on_shutdown():
+    logger.info(f"Статистика кэша пользователей: {users_cache.stats()}")
+    logger.info(f"Статистика кэша курсов: {rates_cache.stats()}")
+    logger.info(f"Статистика кэша курсов на даты: {historical_rates_cache.stats()}")
+    # Дописываем операции, которые ещё стоят в очереди
+    await write_queue.stop()
+    logger.info(f"Статистика очереди записи: {write_queue.stats()}")
+    logger.info(f"Статистика исходящих запросов: {outbound.stats()}")
+    await dp.storage.close()
+    if http_session is not None:
+        await http_session.close()
+    db.close()
+
+
+# Кэш зарегистрированных пользователей: chat_id -> имя (None - не зарегистрирован)
+users_cache = TTLCache(
+    maxsize=int(os.getenv("USERS_CACHE_SIZE", "10000")),
+    ttl=float(os.getenv("USERS_CACHE_TTL", "600"))
+)
+
+
+# Возвращает имя пользователя или None, если он не зарегистрирован
+async def get_user_name(chat_id: int):
+    name = users_cache.get(chat_id)
+    if name is MISSING:
+        # Промах кэша - обращаемся к БД
+        user = await db.fetchone_prepared("user_name", {"chat_id": chat_id})
+        name = user[0] if user else None
+        users_cache.set(chat_id, name)
+    return name
 
 
 # Обработчик команды /start
@@ -39,50 +110,56 @@ async def cmd_start(message: types.Message):
     chat_id = message.chat.id
 
     try:
-        with get_db_connection() as conn:
-            with conn.cursor() as cursor:
-                # Проверяем регистрацию пользователя
-                cursor.execute("SELECT name FROM users WHERE chat_id = %s", (chat_id,))
-                user = cursor.fetchone()
-
-                if user:
-                    # Пользователь зарегистрирован
-                    username = user[0]
-                    welcome_text = (
-                        f"👋 Привет, {username}!\n"
-                        "Я бот для учета финансов. Вот что я умею:\n\n"
-                        "📌 Основные команды:\n"
-                        "/start - Показать это меню\n"
-                        "/reg - Регистрация (уже выполнена)\n"
-                        "/add_operation - Добавить операцию (доход/расход)\n"
-                        "/operations - Просмотр операций с сортировкой\n\n"
-                        "💡 Просто введите нужную команду или выберите из меню."
-                    )
-                else:
-                    # Пользователь не зарегистрирован
-                    welcome_text = (
-                        "👋 Привет, незнакомец!\n"
-                        "Я бот для учета финансов. Для начала работы нужно зарегистрироваться.\n\n"
-                        "📌 Доступные команды:\n"
-                        "/reg - Регистрация в системе\n\n"
-                        "После регистрации вам станут доступны:\n"
-                        "• Добавление операций (/add_operation)\n"
-                        "• Просмотр истории операций (/operations)\n\n"
-                        "Начните с команды /reg"
-                    )
-
-                await message.answer(welcome_text)
+        # Проверяем регистрацию пользователя
+        username = await get_user_name(chat_id)
+
+        if username is not None:
+            # Пользователь зарегистрирован
+            welcome_text = (
+                f"👋 Привет, {username}!\n"
+                "Я бот для учета финансов. Вот что я умею:\n\n"
+                "📌 Основные команды:\n"
+                "/start - Показать это меню\n"
+                "/reg - Регистрация (уже выполнена)\n"
+                "/add_operation - Добавить операцию (доход/расход)\n"
+                "/operations - Просмотр операций с сортировкой\n"
+                "/balance - Доходы, расходы и баланс (/balance ММ.ГГГГ - за месяц)\n"
+                "/import - Загрузить операции из CSV-выписки\n"
+                "/export - Выгрузить операции в файл (/export xlsx - в Excel)\n"
+                "/report - Доходы и расходы по месяцам за последний год\n\n"
+                "💡 Просто введите нужную команду или выберите из меню."
+            )
+        else:
+            # Пользователь не зарегистрирован
+            welcome_text = (
+                "👋 Привет, незнакомец!\n"
+                "Я бот для учета финансов. Для начала работы нужно зарегистрироваться.\n\n"
+                "📌 Доступные команды:\n"
+                "/reg - Регистрация в системе\n\n"
+                "После регистрации вам станут доступны:\n"
+                "• Добавление операций (/add_operation)\n"
+                "• Просмотр истории операций (/operations)\n"
+                "• Баланс доходов и расходов (/balance)\n\n"
+                "Начните с команды /reg"
+            )
+
+        await message.answer(welcome_text)
 
         # Формируем список команд для меню
         commands = [
             types.BotCommand(command="start", description="Начало работы"),
             types.BotCommand(command="reg", description="Регистрация"),
             types.BotCommand(command="add_operation", description="Добавить операцию"),
-            types.BotCommand(command="operations", description="Просмотр операций с сортировкой")
+            types.BotCommand(command="operations", description="Просмотр операций с сортировкой"),
+            types.BotCommand(command="balance", description="Баланс доходов и расходов"),
+            types.BotCommand(command="import", description="Импорт операций из CSV"),
+            types.BotCommand(command="export", description="Выгрузка операций в файл"),
+            types.BotCommand(command="report", description="Отчёт по месяцам за год")
         ]
         # Определяем, какому именно чату показывать список
         scope = types.BotCommandScopeChat(chat_id=message.chat.id)
         # Определяем, какие команды показывать
+        # (повторная отправка того же меню пропускается планировщиком)
         await bot.set_my_commands(commands, scope=scope)
 
     except Exception as e:
@@ -103,12 +180,9 @@ async def cmd_reg(message: types.Message, state: FSMContext):
 
     try:
         # Проверяем, зарегистрирован ли уже пользователь
-        with get_db_connection() as conn:
-            with conn.cursor() as cursor:
-                cursor.execute("SELECT id FROM users WHERE chat_id = %s", (chat_id,))
-                if cursor.fetchone() is not None:
-                    await message.answer("❌ Вы уже зарегистрированы!")
-                    return
+        if await get_user_name(chat_id) is not None:
+            await message.answer("❌ Вы уже зарегистрированы!")
+            return
 
         # Если не зарегистрирован - просим ввести логин
         await message.answer("📝 Введите ваш логин для регистрации:")
@@ -138,13 +212,10 @@ async def process_name(message: types.Message, state: FSMContext):
 
     try:
         # Сохраняем пользователя в базу данных
-        with get_db_connection() as conn:
-            with conn.cursor() as cursor:
-                cursor.execute(
-                    "INSERT INTO users (chat_id, name) VALUES (%s, %s)",
-                    (chat_id, name)
-                )
-                conn.commit() # Фиксируем изменения
+        # Транзакция фиксируется автоматически
+        await db.execute_prepared("insert_user", {"chat_id": chat_id, "name": name})
+        # Сбрасываем закэшированный статус "не зарегистрирован"
+        users_cache.invalidate(chat_id)
 
         # Отправляем сообщение об успешной регистрации
         await message.answer(f"✅ Регистрация успешна, {name}!\n"
@@ -162,6 +233,41 @@ async def process_name(message: types.Message, state: FSMContext):
         await state.clear()
 
 
+# Обработчик команды /stats - статистика кэша пользователей, очереди записи,
+# исходящих запросов и подготовленных запросов к БД
+@dp.message(Command("stats"))
+async def cmd_stats(message: types.Message):
+    stats = users_cache.stats()
+    queue_stats = write_queue.stats()
+    outbound_stats = outbound.stats()
+    statement_stats = statements.stats()
+    distribution = ", ".join(
+        f"{size}: {count}" for size, count in queue_stats['distribution'].items()
+    ) or "нет данных"
+    await message.answer(
+        f"🗂 Кэш пользователей\n"
+        f"Записей: {stats['size']}\n"
+        f"Попаданий: {stats['hits']}\n"
+        f"Промахов: {stats['misses']}\n"
+        f"Доля попаданий: {stats['hit_rate']}\n\n"
+        f"📝 Очередь записи операций\n"
+        f"В очереди: {queue_stats['queued']}\n"
+        f"Пакетов: {queue_stats['batches']}\n"
+        f"Средний размер пакета: {queue_stats['avg_batch']}\n"
+        f"Размеры пакетов: {distribution}\n\n"
+        f"📤 Исходящие запросы\n"
+        f"В очереди: {outbound_stats['queued']}\n"
+        f"Отправлено: {outbound_stats['sent']}\n"
+        f"Пропущено повторных меню: {outbound_stats['coalesced']}\n"
+        f"Повторов после 429: {outbound_stats['retries']}\n"
+        f"Ожидание p50/p95: {outbound_stats['wait_p50_ms']}/{outbound_stats['wait_p95_ms']} мс\n\n"
+        f"🧾 Подготовленные запросы\n"
+        f"Запросов в реестре: {statement_stats['statements']}\n"
+        f"Подготовлено (PREPARE): {statement_stats['prepares']}\n"
+        f"Выполнено (EXECUTE): {statement_stats['executions']}"
+    )
+
+
 # Создаем состояния для добавления операции
 class AddOperationStates(StatesGroup):
     waiting_for_type = State()  # Ожидание выбора типа операции
@@ -176,12 +282,9 @@ async def cmd_add_operation(message: types.Message, state: FSMContext):
 
     try:
         # Проверяем, зарегистрирован ли пользователь
-        with get_db_connection() as conn:
-            with conn.cursor() as cursor:
-                cursor.execute("SELECT id FROM users WHERE chat_id = %s", (chat_id,))
-                if cursor.fetchone() is None:
-                    await message.answer("❌ Вы не зарегистрированы! Сначала выполните /reg")
-                    return
+        if await get_user_name(chat_id) is None:
+            await message.answer("❌ Вы не зарегистрированы! Сначала выполните /reg")
+            return
 
         # Создаем клавиатуру с типами операций
         keyboard = types.ReplyKeyboardMarkup(
@@ -219,16 +322,24 @@ async def wrong_operation_type(message: types.Message):
 @dp.message(AddOperationStates.waiting_for_amount)
 async def process_operation_amount(message: types.Message, state: FSMContext):
     try:
-        amount = float(message.text.replace(',', '.'))  # Поддержка и запятых, и точек
+        amount = Decimal(message.text.strip().replace(',', '.'))  # Поддержка и запятых, и точек
+        if not amount.is_finite():
+            raise ValueError
+        # Округляем до копеек так же, как колонка DECIMAL(10, 2): тогда итоги
+        # в balances совпадают с суммой строк operations
+        amount = amount.quantize(Decimal("0.01"), rounding=ROUND_HALF_UP)
         if amount <= 0:
             await message.answer("❌ Сумма должна быть больше нуля. Введите снова:")
             return
+        if amount > MAX_SUM:
+            await message.answer(f"❌ Сумма слишком большая (максимум {MAX_SUM}). Введите снова:")
+            return
 
-        await state.update_data(sum=amount)  # Сохраняем сумму
+        await state.update_data(sum=str(amount))  # Сохраняем сумму (строкой - данные FSM хранятся в JSON)
         await message.answer("📅 Введите дату операции в формате ДД.ММ.ГГГГ (например, 01.01.2025):")
         await state.set_state(AddOperationStates.waiting_for_date)
 
-    except ValueError:
+    except (ValueError, InvalidOperation):
         await message.answer("❌ Неверный формат суммы. Введите число:")
 
 
@@ -238,28 +349,249 @@ async def process_operation_date(message: types.Message, state: FSMContext):
     try:
         # Парсинг строки в дату без времени
         date = datetime.strptime(message.text, "%d.%m.%Y").date()
+        if not is_valid_operation_date(date):
+            await message.answer("❌ Дата вне допустимого диапазона (с 01.01.2000 и не позже чем через год). "
+                                 "Введите другую дату:")
+            return
 
         # Получаем все сохраненные данные
         data = await state.get_data()
         chat_id = message.chat.id
 
-        # Сохраняем операцию в БД
-        with get_db_connection() as conn:
-            with conn.cursor() as cursor:
-                cursor.execute(
-                    "INSERT INTO operations (date, sum, chat_id, type_operation) VALUES (%s, %s, %s, %s)",
-                    (date, data['sum'], chat_id, data['type_operation'])
-                )
-                conn.commit()
+        # Сумма уже округлена до копеек (str() - и для состояний, сохранённых числом)
+        amount = Decimal(str(data['sum'])).quantize(Decimal("0.01"), rounding=ROUND_HALF_UP)
+
+        # Ставим операцию в очередь записи и ждём, пока её пакет будет зафиксирован в БД
+        await write_queue.submit(date, amount, chat_id, data['type_operation'])
+        # Отчёт пользователя устарел
+        reports_cache.invalidate(chat_id)
 
         await message.answer(f"✅ Операция успешно добавлена!\n"
                              f"Тип: {data['type_operation']}\n"
-                             f"Сумма: {round(data['sum'], 2)} руб.\n"
+                             f"Сумма: {amount} руб.\n"
                              f"Дата: {date.strftime('%d.%m.%Y')}")
         await state.clear()
 
     except ValueError:
         await message.answer("❌ Неверный формат даты. Введите в формате ДД.ММ.ГГГГ:")
+    except Exception as e:
+        logger.error(f"Ошибка при сохранении операции: {e}")
+        await message.answer("⚠️ Не удалось сохранить операцию. Попробуйте позже: /add_operation")
+        await state.clear()
+
+
+# Обработчик команды /balance - итоги доходов и расходов
+# (/balance - за всё время, /balance ММ.ГГГГ - за указанный месяц)
+@dp.message(Command("balance"))
+async def cmd_balance(message: types.Message, command: CommandObject):
+    chat_id = message.chat.id
+
+    month = None
+    if command.args:
+        try:
+            month = datetime.strptime(command.args.strip(), "%m.%Y").date()
+        except ValueError:
+            await message.answer("❌ Неверный формат месяца. Используйте /balance ММ.ГГГГ")
+            return
+
+    try:
+        if await get_user_name(chat_id) is None:
+            await message.answer("❌ Вы не зарегистрированы! Сначала выполните /reg")
+            return
+
+        # Итоги читаются одной строкой из таблицы агрегатов
+        if month is None:
+            row = await db.fetchone_prepared("balance", {"chat_id": chat_id})
+            period = "за всё время"
+        else:
+            row = await db.fetchone_prepared("monthly_balance", {"chat_id": chat_id, "month": month})
+            period = f"за {month.strftime('%m.%Y')}"
+
+        income, expense = row if row else (0, 0)
+        await message.answer(
+            f"💰 Баланс {period}:\n"
+            f"Доходы: {income} руб.\n"
+            f"Расходы: {expense} руб.\n"
+            f"Итого: {income - expense} руб."
+        )
+
+    except Exception as e:
+        logger.error(f"Ошибка при получении баланса: {e}")
+        await message.answer("⚠️ Произошла ошибка. Попробуйте позже.")
+
+
+# Максимальный размер файла выписки (ограничение Bot API на скачивание - 20 МБ)
+MAX_IMPORT_FILE_SIZE = 20 * 1024 * 1024
+# Сколько новых месяцев (секций operations) может создать одна выписка
+MAX_IMPORT_NEW_PARTITIONS = int(os.getenv("MAX_IMPORT_NEW_PARTITIONS", "36"))
+
+
+# Создаем состояния для импорта операций
+class ImportStates(StatesGroup):
+    waiting_for_file = State()  # Ожидание файла выписки
+
+
+# Обработчик команды /import - загрузка операций из CSV-выписки
+@dp.message(Command("import"))
+async def cmd_import(message: types.Message, state: FSMContext):
+    chat_id = message.chat.id
+
+    try:
+        if await get_user_name(chat_id) is None:
+            await message.answer("❌ Вы не зарегистрированы! Сначала выполните /reg")
+            return
+
+        await message.answer(
+            "📎 Отправьте CSV-файл с операциями. Колонки:\n"
+            "дата (ДД.ММ.ГГГГ или ГГГГ-ММ-ДД); сумма; тип (ДОХОД/РАСХОД)\n"
+            "Если тип не указан, отрицательная сумма считается расходом."
+        )
+        await state.set_state(ImportStates.waiting_for_file)
+
+    except Exception as e:
+        logger.error(f"Ошибка при старте импорта: {e}")
+        await message.answer("⚠️ Произошла ошибка. Попробуйте позже.")
+
+
+# Обработчик файла выписки
+@dp.message(ImportStates.waiting_for_file, F.document)
+async def process_import_file(message: types.Message, state: FSMContext):
+    chat_id = message.chat.id
+    document = message.document
+
+    if document.file_size and document.file_size > MAX_IMPORT_FILE_SIZE:
+        await message.answer("❌ Файл слишком большой (максимум 20 МБ)")
+        return
+
+    try:
+        await message.answer("⏳ Обрабатываю файл...")
+        file = await bot.download(document)
+
+        # Разбор выполняется вне цикла событий, чтобы не задерживать другие чаты
+        loop = asyncio.get_running_loop()
+        result = await loop.run_in_executor(None, parse_statement, file, chat_id)
+
+        # Все принятые строки загружаются одним COPY в одной транзакции
+        if result.accepted:
+            await db.run_with_partitions(result.monthly, load_statement, chat_id, result,
+                                         max_new=MAX_IMPORT_NEW_PARTITIONS)
+            reports_cache.invalidate(chat_id)
+
+        report = [
+            "✅ Импорт завершён",
+            f"Принято: {result.accepted}",
+            f"Отклонено: {result.rejected}"
+        ]
+        if result.errors:
+            report.append("\nПримеры ошибок:")
+            report.extend(result.errors)
+        await message.answer("\n".join(report))
+
+    except PartitionLimitError as e:
+        # Выписка затрагивает слишком много новых месяцев
+        await message.answer(f"❌ {e}. Разбейте выписку на несколько файлов. Ни одна строка не сохранена.")
+    except Exception as e:
+        logger.error(f"Ошибка при импорте операций: {e}")
+        await message.answer("⚠️ Не удалось импортировать операции. Ни одна строка не сохранена.")
+    await state.clear()
+
+
+# Обработчик сообщения без файла при импорте
+@dp.message(ImportStates.waiting_for_file)
+async def wrong_import_file(message: types.Message):
+    await message.answer("❌ Пожалуйста, отправьте CSV-файл документом:")
+
+
+# Обработчик команды /export - выгрузка всех операций в CSV (по умолчанию) или XLSX
+@dp.message(Command("export"))
+async def cmd_export(message: types.Message, command: CommandObject):
+    chat_id = message.chat.id
+    file_format = (command.args or "csv").strip().lower()
+
+    if file_format not in EXPORT_FORMATS:
+        await message.answer("❌ Неизвестный формат. Используйте /export csv или /export xlsx")
+        return
+
+    path = None
+    try:
+        if await get_user_name(chat_id) is None:
+            await message.answer("❌ Вы не зарегистрированы! Сначала выполните /reg")
+            return
+
+        await message.answer("⏳ Готовлю файл...")
+        # Файл пишется порциями из серверного курсора в потоке пула БД
+        path = await db.run_on_connection(export_operations, chat_id, file_format)
+        await message.answer_document(
+            types.FSInputFile(path, filename=f"operations.{file_format}"),
+            caption="📄 Ваши операции"
+        )
+
+    except Exception as e:
+        logger.error(f"Ошибка при выгрузке операций: {e}")
+        await message.answer("⚠️ Не удалось выгрузить операции. Попробуйте позже.")
+    finally:
+        if path is not None:
+            os.remove(path)
+
+
+# Кэш отчётов: chat_id -> (месяц построения, текст отчёта).
+# Сбрасывается при добавлении операций пользователем; отчёт прошлого месяца не используется
+reports_cache = TTLCache(
+    maxsize=int(os.getenv("REPORTS_CACHE_SIZE", "10000")),
+    ttl=float(os.getenv("REPORTS_CACHE_TTL", "86400"))
+)
+
+# За сколько месяцев (включая текущий) строится отчёт
+REPORT_MONTHS = 12
+
+
+# Строим отчёт в SQL: суммы по месяцам и типам операций
+async def build_report(chat_id: int, current_month) -> str:
+    # Первое число месяца, с которого начинается отчёт
+    total_months = current_month.year * 12 + current_month.month - REPORT_MONTHS
+    start = current_month.replace(year=total_months // 12, month=total_months % 12 + 1)
+
+    rows = await db.fetchall_prepared("report", {"chat_id": chat_id, "start": start})
+    if not rows:
+        return "📭 За последний год операций нет"
+
+    # Сводим строки вида (месяц, тип, сумма) в {месяц: [доходы, расходы]}
+    months = {}
+    for month, op_type, total in rows:
+        totals = months.setdefault(month, [0, 0])
+        totals[0 if op_type == "ДОХОД" else 1] = total
+
+    lines = ["📈 Доходы и расходы по месяцам за последний год:\n"]
+    for month, (income, expense) in months.items():
+        lines.append(
+            f"{month.strftime('%m.%Y')}: доход {income} руб., расход {expense} руб., "
+            f"итого {income - expense} руб."
+        )
+    return "\n".join(lines)
+
+
+# Обработчик команды /report - отчёт по месяцам за последний год
+@dp.message(Command("report"))
+async def cmd_report(message: types.Message):
+    chat_id = message.chat.id
+    current_month = datetime.now().date().replace(day=1)
+
+    try:
+        cached = reports_cache.get(chat_id)
+        if cached is not MISSING and cached[0] == current_month:
+            report = cached[1]
+        else:
+            if await get_user_name(chat_id) is None:
+                await message.answer("❌ Вы не зарегистрированы! Сначала выполните /reg")
+                return
+            report = await build_report(chat_id, current_month)
+            reports_cache.set(chat_id, (current_month, report))
+
+        await message.answer(report)
+
+    except Exception as e:
+        logger.error(f"Ошибка при построении отчёта: {e}")
+        await message.answer("⚠️ Произошла ошибка. Попробуйте позже.")
 
 
 # Создаем состояния для просмотра операций
@@ -271,32 +603,126 @@ class OperationsStates(StatesGroup):
 
 # URL для внешнего сервиса курсов валют
 EXCHANGE_SERVICE_URL = "http://127.0.0.1:5000/rate"
+# URL для получения курсов на даты (много дат одним запросом)
+EXCHANGE_SERVICE_HISTORY_URL = "http://127.0.0.1:5000/rates/history"
+
+
+# Общая HTTP-сессия (создаётся при запуске бота)
+http_session = None
+
+# Кэш текущих курсов валют: курс меняется редко, поэтому храним его заданное время
+rates_cache = TTLCache(maxsize=10000, ttl=float(os.getenv("EXCHANGE_RATE_TTL", "300")))
+# Кэш курсов на даты: (валюта, дата) -> курс. Курс за прошедшую дату
+# не меняется, поэтому записи живут сутки (вытесняются по размеру)
+historical_rates_cache = TTLCache(maxsize=100000, ttl=float(os.getenv("HISTORICAL_RATE_TTL", "86400")))
 
+# Запросы курса, которые выполняются прямо сейчас: валюта -> задача
+rate_requests = {}
+# Запросы курсов на даты, которые выполняются прямо сейчас: (валюта, дата) -> задача
+historical_rate_requests = {}
 
-# При обращении получаем курс валюты от внешнего сервиса
+
+# Запрос курса валюты у внешнего сервиса
+async def fetch_exchange_rate(currency: str) -> float:
+    async with http_session.get(
+            EXCHANGE_SERVICE_URL,
+            params={"currency": currency}
+    ) as response:
+
+        if response.status == 200:
+            data = await response.json()
+            return data["rate"]
+        elif response.status == 400:
+            raise ValueError("Неизвестная валюта")
+        else:
+            raise ValueError("Ошибка сервиса курсов")
+
+
+# При обращении получаем курс валюты из кэша или от внешнего сервиса
 async def get_exchange_rate(currency: str) -> float:
+    rate = rates_cache.get(currency)
+    if rate is not MISSING:
+        return rate
+
     try:
-        # Создаётся асинхронный HTTP-клиент
-        async with aiohttp.ClientSession() as session:
-            async with session.get(
-                    EXCHANGE_SERVICE_URL,
-                    params={"currency": currency},
-                    timeout=aiohttp.ClientTimeout(total=5.0)
-            ) as response:
-
-                if response.status == 200:
-                    data = await response.json()
-                    return data["rate"]
-                elif response.status == 400:
-                    raise ValueError("Неизвестная валюта")
-                else:
-                    raise ValueError("Ошибка сервиса курсов")
+        # Одновременные промахи по одной валюте ждут один и тот же запрос
+        task = rate_requests.get(currency)
+        if task is None:
+            task = asyncio.create_task(fetch_exchange_rate(currency))
+            rate_requests[currency] = task
+            task.add_done_callback(lambda _: rate_requests.pop(currency, None))
+
+        # shield: отмена одного ожидающего не отменяет общий запрос
+        rate = await asyncio.shield(task)
+        rates_cache.set(currency, rate)
+        return rate
 
     except Exception as e:
         logger.error(f"Ошибка при получении курса: {e}")
         raise
 
 
+# Запрос курсов на даты у внешнего сервиса одним вызовом.
+# Возвращает словарь {дата: курс}
+async def fetch_historical_rates(currency: str, dates: list) -> dict:
+    async with http_session.post(
+            EXCHANGE_SERVICE_HISTORY_URL,
+            json={"items": [{"currency": currency, "date": date.isoformat()} for date in dates]}
+    ) as response:
+        if response.status != 200:
+            raise ValueError("Ошибка сервиса курсов")
+        data = await response.json()
+
+    rates = {}
+    for date, item in zip(dates, data["rates"]):
+        if "rate" in item:
+            rates[date] = float(item["rate"])
+        else:
+            # Для дат раньше начала истории курсов используем текущий курс
+            rates[date] = float(await get_exchange_rate(currency))
+        historical_rates_cache.set((currency, date), rates[date])
+    return rates
+
+
+# Курсы на даты операций: все даты, которых нет в кэше, запрашиваются одним вызовом.
+# Возвращает словарь {дата: курс}
+async def get_historical_rates(currency: str, dates) -> dict:
+    rates = {}
+    tasks = {}  # дата -> задача, которая получает её курс
+    missing = []
+    for date in set(dates):
+        rate = historical_rates_cache.get((currency, date))
+        if rate is not MISSING:
+            rates[date] = rate
+        elif (currency, date) in historical_rate_requests:
+            # Эту дату уже запрашивает другой обработчик - ждём его запрос
+            tasks[date] = historical_rate_requests[(currency, date)]
+        else:
+            missing.append(date)
+
+    if missing:
+        task = asyncio.create_task(fetch_historical_rates(currency, missing))
+        for date in missing:
+            historical_rate_requests[(currency, date)] = task
+            tasks[date] = task
+
+        def release(done, dates=missing):
+            for date in dates:
+                if historical_rate_requests.get((currency, date)) is done:
+                    del historical_rate_requests[(currency, date)]
+        task.add_done_callback(release)
+
+    try:
+        # shield: отмена одного ожидающего не отменяет общий запрос
+        for date, task in tasks.items():
+            rates[date] = (await asyncio.shield(task))[date]
+        return rates
+
+    except Exception as e:
+        logger.error(f"Ошибка при получении курсов на даты: {e}")
+        raise
+
+
 # Обработчик команды /operations - процесс просмотра операций
 @dp.message(Command("operations"))
 async def cmd_operations(message: types.Message, state: FSMContext):
@@ -304,12 +730,9 @@ async def cmd_operations(message: types.Message, state: FSMContext):
 
     try:
         # Проверяем регистрацию пользователя
-        with get_db_connection() as conn:
-            with conn.cursor() as cursor:
-                cursor.execute("SELECT id FROM users WHERE chat_id = %s", (chat_id,))
-                if cursor.fetchone() is None:
-                    await message.answer("❌ Вы не зарегистрированы! Сначала выполните /reg")
-                    return
+        if await get_user_name(chat_id) is None:
+            await message.answer("❌ Вы не зарегистрированы! Сначала выполните /reg")
+            return
 
         # Клавиатура для выбора колонки сортировки
         columns_keyboard = types.ReplyKeyboardMarkup(
@@ -403,25 +826,97 @@ async def wrong_sort_direction(message: types.Message):
     await message.answer("❌ Пожалуйста, выберите направление сортировки кнопкой:")
 
 
-# Обработчик выбора валюты и вывода операций
-@dp.message(OperationsStates.waiting_for_currency, F.text.in_(["RUB", "EUR", "USD"]))
+# Количество операций на одной странице вывода
+OPERATIONS_PAGE_SIZE = int(os.getenv("OPERATIONS_PAGE_SIZE", "20"))
+
+# Валюты, доступные для отображения
+CURRENCIES = ("RUB", "EUR", "USD")
+
+
+# Данные кнопок навигации: параметры выборки и ключ граничной строки страницы
+class OperationsPage(CallbackData, prefix="ops"):
+    action: str  # next - следующая страница, prev - предыдущая
+    column: str  # Колонка сортировки
+    direction: str  # Направление сортировки
+    currency: str  # Валюта отображения
+    value: str  # Значение колонки сортировки в граничной строке
+    id: int  # id граничной строки (разрешает повторы значений)
+
+
+# Строковое представление значения колонки сортировки для ключа страницы
+def sort_key_value(row, column: str) -> str:
+    _, date, amount, op_type = row
+    if column == "date":
+        return date.isoformat()
+    if column == "sum":
+        return str(amount)
+    return op_type
+
+
+# Получаем одну страницу операций по ключу (keyset-пагинация).
+# after - пара (значение колонки, id) граничной строки; backward - движение назад.
+# Возвращает строки страницы и признак того, что в этом направлении есть ещё строки.
+async def fetch_operations_page(chat_id: int, column: str, direction: str,
+                                after: tuple = None, backward: bool = False):
+    name = operations_page_statement(column, direction, keyset=after is not None, backward=backward)
+    # Запрашиваем на одну строку больше, чтобы узнать, есть ли следующая страница
+    params = {"chat_id": chat_id, "limit": OPERATIONS_PAGE_SIZE + 1}
+    if after is not None:
+        params["value"], params["id"] = after
+
+    rows = await db.fetchall_prepared(name, params)
+    has_more = len(rows) > OPERATIONS_PAGE_SIZE
+    rows = rows[:OPERATIONS_PAGE_SIZE]
+    if backward:
+        rows.reverse()
+    return rows, has_more
+
+
+# Формируем кнопки "назад/вперёд" для страницы
+def operations_page_keyboard(rows, column: str, direction: str, currency: str,
+                             has_prev: bool, has_next: bool):
+    builder = InlineKeyboardBuilder()
+    if has_prev:
+        builder.button(
+            text="⬅️ Назад",
+            callback_data=OperationsPage(
+                action="prev", column=column, direction=direction, currency=currency,
+                value=sort_key_value(rows[0], column), id=rows[0][0]
+            )
+        )
+    if has_next:
+        builder.button(
+            text="Вперёд ➡️",
+            callback_data=OperationsPage(
+                action="next", column=column, direction=direction, currency=currency,
+                value=sort_key_value(rows[-1], column), id=rows[-1][0]
+            )
+        )
+    return builder.as_markup() if (has_prev or has_next) else None
+
+
+# Получаем курсы для конвертации страницы: 1.0 для RUB,
+# иначе словарь {дата: курс} по курсу на дату каждой операции
+async def get_display_rate(currency: str, rows):
+    if currency == "RUB":
+        return 1.0
+    # Запрашиваем курсы у сервиса одним запросом на всю страницу
+    return await get_historical_rates(currency, [row[1] for row in rows])
+
+
+# Обработчик выбора валюты и вывода первой страницы операций
+@dp.message(OperationsStates.waiting_for_currency, F.text.in_(CURRENCIES))
 async def process_currency(message: types.Message, state: FSMContext):
     chat_id = message.chat.id
     currency = message.text
     data = await state.get_data()
+    column, direction = data['sort_column'], data['sort_direction']
 
     try:
-        # Получаем операции из БД с учетом сортировки
-        with get_db_connection() as conn:
-            with conn.cursor() as cursor:
-                cursor.execute(
-                    f"SELECT date, sum, type_operation FROM operations "
-                    f"WHERE chat_id = %s ORDER BY {data['sort_column']} {data['sort_direction']}",
-                    (chat_id,)
-                )
-                operations = cursor.fetchall()
-
-        if not operations:
+        # Получаем первую страницу операций с учетом сортировки
+        rows, has_next = await fetch_operations_page(chat_id, column, direction)
+
+        if not rows:
             await message.answer(
                 "📭 У вас пока нет операций",
                 reply_markup=types.ReplyKeyboardRemove() # Явное удаление
@@ -430,14 +925,11 @@ async def process_currency(message: types.Message, state: FSMContext):
             return
 
         # Получаем курс для конвертации
-        rate = 1.0  # По умолчанию для RUB
-        if currency != "RUB":
-            try:
-                # Запрашиваем курс у сервиса через функцию
-                rate = float(await get_exchange_rate(currency))
-            except Exception:
-                await message.answer(f"⚠️ Не удалось получить курс {currency}. Показываю в RUB")
-                currency = "RUB"
+        try:
+            rate = await get_display_rate(currency, rows)
+        except Exception:
+            await message.answer(f"⚠️ Не удалось получить курс {currency}. Показываю в RUB")
+            currency, rate = "RUB", 1.0
 
         # Для красивого вывода названий колонок
         column_names = {
@@ -446,24 +938,19 @@ async def process_currency(message: types.Message, state: FSMContext):
             "type_operation": "типу операции"
         }
 
-        # Формируем сообщение с операциями
-        response = [
-            f"📊 Ваши операции (в {currency}), отсортированные по {column_names[data['sort_column']]} "
-            f"({'по убыванию' if data['sort_direction'] == 'DESC' else 'по возрастанию'}):\n"
-        ]
-
-        # Добавляем сами операции
-        for op in operations:
-            date, amount, op_type = op
-            converted_amount = round(float(amount) / rate, 2)
-
-            response.append(
-                f"{date.strftime('%d.%m.%Y')} - "
-                f"{converted_amount} {currency} - "
-                f"{op_type}"
+        # Заголовок отправляем отдельно, вместе с ним убираем клавиатуру выбора
+        await message.answer(
+            f"📊 Ваши операции (в {currency}{' по курсу на дату операции' if currency != 'RUB' else ''}), отсортированные по {column_names[column]} "
+            f"({'по убыванию' if direction == 'DESC' else 'по возрастанию'}):",
+            reply_markup=types.ReplyKeyboardRemove()
+        )
+        # Первая страница с кнопками навигации
+        await message.answer(
+            format_operations(rows, currency, rate),
+            reply_markup=operations_page_keyboard(
+                rows, column, direction, currency, has_prev=False, has_next=has_next
             )
-
-        await message.answer("\n".join(response), reply_markup=types.ReplyKeyboardRemove())
+        )
         await state.clear()
 
     except Exception as e:
@@ -472,6 +959,43 @@ async def process_currency(message: types.Message, state: FSMContext):
         await state.clear()
 
 
+# Обработчик кнопок навигации по страницам операций
+@dp.callback_query(OperationsPage.filter())
+async def process_operations_page(callback: types.CallbackQuery, callback_data: OperationsPage):
+    chat_id = callback.message.chat.id
+    column, direction = callback_data.column, callback_data.direction
+    currency = callback_data.currency
+    backward = callback_data.action == "prev"
+
+    try:
+        if currency not in CURRENCIES:
+            raise ValueError("Недопустимая валюта")
+
+        rows, has_more = await fetch_operations_page(
+            chat_id, column, direction,
+            after=(callback_data.value, callback_data.id), backward=backward
+        )
+        if not rows:
+            await callback.answer("Больше операций нет")
+            return
+
+        rate = await get_display_rate(currency, rows)
+        # Страница, с которой пришли, всегда существует в обратном направлении
+        has_prev, has_next = (has_more, True) if backward else (True, has_more)
+
+        await callback.message.edit_text(
+            format_operations(rows, currency, rate),
+            reply_markup=operations_page_keyboard(
+                rows, column, direction, currency, has_prev=has_prev, has_next=has_next
+            )
+        )
+        await callback.answer()
+
+    except Exception as e:
+        logger.error(f"Ошибка при переключении страницы операций: {e}")
+        await callback.answer("⚠️ Не удалось загрузить страницу", show_alert=True)
+
+
 # Обработчик некорректной валюты
 @dp.message(OperationsStates.waiting_for_currency)
 async def wrong_currency(message: types.Message):
@@ -485,6 +1009,5 @@ async def main():
 
 
 if __name__ == "__main__":
-    import asyncio
     # Запускаем асинхронную функцию main()
     asyncio.run(main())
@@ -0,0 +1,56 @@
+import time # Для отсчёта времени жизни записей
+from collections import OrderedDict # Упорядоченный словарь для вытеснения старых записей
+
+
+# Маркер отсутствия записи (None тоже может быть закэшированным значением)
+MISSING = object()
+
+
+# Кэш в памяти процесса с ограниченным размером и временем жизни записей.
+# При переполнении вытесняется запись, к которой дольше всего не обращались.
+class TTLCache:
+    def __init__(self, maxsize: int = 10000, ttl: float = 600.0):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data = OrderedDict()  # ключ -> (время истечения, значение)
+        self.hits = 0  # Число попаданий
+        self.misses = 0  # Число промахов
+
+    # Возвращает значение или MISSING, если записи нет или она устарела
+    def get(self, key):
+        item = self._data.get(key)
+        if item is not None:
+            expires_at, value = item
+            if expires_at > time.monotonic():
+                self._data.move_to_end(key)
+                self.hits += 1
+                return value
+            # Запись устарела - удаляем её
+            del self._data[key]
+        self.misses += 1
+        return MISSING
+
+    # Сохраняет значение и вытесняет лишние записи
+    def set(self, key, value):
+        self._data[key] = (time.monotonic() + self.ttl, value)
+        self._data.move_to_end(key)
+        while len(self._data) > self.maxsize:
+            self._data.popitem(last=False)
+
+    # Удаляет запись (например, после изменения данных в БД)
+    def invalidate(self, key):
+        self._data.pop(key, None)
+
+    # Полностью очищает кэш
+    def clear(self):
+        self._data.clear()
+
+    # Статистика для контроля нагрузки на БД
+    def stats(self) -> dict:
+        total = self.hits + self.misses
+        return {
+            "size": len(self._data),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / total, 3) if total else 0.0
+        }
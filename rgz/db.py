@@ -0,0 +1,269 @@
+import os # Для доступа к переменным окружения
+import asyncio # Для запуска блокирующих запросов вне цикла событий
+from concurrent.futures import ThreadPoolExecutor # Ограниченный пул потоков
+from datetime import date, timedelta # Допустимый диапазон дат операций
+from psycopg2 import errors # Коды ошибок PostgreSQL
+from psycopg2.pool import ThreadedConnectionPool # Потокобезопасный пул соединений
+from psycopg2.extras import execute_values # Многострочные INSERT одним запросом
+from statements import PreparedConnection, StatementRegistry # Подготовленные запросы
+
+
+# Параметры подключения к базе данных
+DB_CONFIG = {
+    "host": "localhost",
+    "port": 5432,
+    "database": "rpp_rgz",
+    "user": "postgres",
+    "password": "postgres"
+}
+
+# Размер пула задаётся при запуске через переменные окружения
+DB_POOL_MIN = int(os.getenv("DB_POOL_MIN", "2"))
+DB_POOL_MAX = int(os.getenv("DB_POOL_MAX", "20"))
+
+
+# Допустимые даты операций. Для каждого месяца операций создаётся секция,
+# поэтому даты вне этого окна (например, 01.01.0001) не принимаются
+MIN_OPERATION_DATE = date(2000, 1, 1)
+OPERATION_DAYS_AHEAD = 366
+
+
+def is_valid_operation_date(value) -> bool:
+    return MIN_OPERATION_DATE <= value <= date.today() + timedelta(days=OPERATION_DAYS_AHEAD)
+
+
+# Белые списки параметров, которые подставляются в текст SQL-запроса
+SORT_COLUMNS = ("date", "sum", "type_operation")
+SORT_DIRECTIONS = ("ASC", "DESC")
+
+
+# Текст запроса страницы операций (keyset-пагинация).
+# Именованные параметры: chat_id, limit и, если keyset, value и id граничной строки.
+# При движении назад (backward) сравнение и порядок сортировки меняются на обратные.
+# При сортировке по дате граница дублируется простым условием на date,
+# чтобы планировщик отбросил секции operations, лежащие за границей.
+def operations_page_query(column: str, direction: str, keyset: bool = False,
+                          backward: bool = False) -> str:
+    if column not in SORT_COLUMNS or direction not in SORT_DIRECTIONS:
+        raise ValueError("Недопустимые параметры сортировки")
+
+    descending = (direction == "DESC") != backward
+    order = "DESC" if descending else "ASC"
+    compare = "<" if descending else ">"
+
+    query = "SELECT id, date, sum, type_operation FROM operations WHERE chat_id = %(chat_id)s"
+    if keyset:
+        if column == "date":
+            query += f" AND date {compare}= %(value)s"
+        query += f" AND ({column}, id) {compare} (%(value)s, %(id)s)"
+    return query + f" ORDER BY {column} {order}, id {order} LIMIT %(limit)s"
+
+
+# Имя подготовленного запроса страницы операций
+def operations_page_statement(column: str, direction: str, keyset: bool = False,
+                              backward: bool = False) -> str:
+    if column not in SORT_COLUMNS or direction not in SORT_DIRECTIONS:
+        raise ValueError("Недопустимые параметры сортировки")
+    suffix = ("_before" if backward else "_after") if keyset else ""
+    return f"operations_{column}_{direction.lower()}{suffix}"
+
+
+# Фиксированный набор запросов бота: каждый подготавливается один раз на соединение
+statements = StatementRegistry()
+statements.register("user_name", "SELECT name FROM users WHERE chat_id = %(chat_id)s")
+statements.register("insert_user", "INSERT INTO users (chat_id, name) VALUES (%(chat_id)s, %(name)s)")
+statements.register("balance", "SELECT income, expense FROM balances WHERE chat_id = %(chat_id)s")
+statements.register(
+    "monthly_balance",
+    "SELECT income, expense FROM monthly_balances WHERE chat_id = %(chat_id)s AND month = %(month)s"
+)
+statements.register(
+    "report",
+    "SELECT date_trunc('month', date)::date AS month, type_operation, SUM(sum) "
+    "FROM operations WHERE chat_id = %(chat_id)s AND date >= %(start)s "
+    "GROUP BY month, type_operation ORDER BY month DESC"
+)
+# Все варианты /operations из белых списков: первая страница, вперёд и назад от границы
+for _column in SORT_COLUMNS:
+    for _direction in SORT_DIRECTIONS:
+        for _keyset, _backward in ((False, False), (True, False), (True, True)):
+            statements.register(
+                operations_page_statement(_column, _direction, _keyset, _backward),
+                operations_page_query(_column, _direction, _keyset, _backward)
+            )
+
+
+# Создаёт секции operations для указанных месяцев (отдельной транзакцией)
+# Запрос требует создать больше секций, чем разрешено за раз
+class PartitionLimitError(ValueError):
+    pass
+
+
+# max_new - сколько секций можно создать за раз (None - без ограничения).
+# Возвращает число созданных секций.
+def create_partitions(cursor, months, max_new: int = None) -> int:
+    cursor.execute(
+        "SELECT month FROM unnest(%s::date[]) AS month "
+        "WHERE to_regclass('operations_' || to_char(month, 'YYYY_MM')) IS NULL",
+        (list(months),)
+    )
+    missing = [row[0] for row in cursor.fetchall()]
+    if max_new is not None and len(missing) > max_new:
+        raise PartitionLimitError(f"Слишком много новых месяцев: {len(missing)} (допустимо не больше {max_new})")
+    for month in missing:
+        cursor.execute("SELECT ensure_operations_partition(%s)", (month,))
+    return len(missing)
+
+
+# Добавляет суммы к агрегатам balances и monthly_balances.
+# monthly - словарь {первое число месяца: (доходы, расходы)}.
+def add_to_balances(cursor, chat_id: int, monthly: dict):
+    income = sum(values[0] for values in monthly.values())
+    expense = sum(values[1] for values in monthly.values())
+    cursor.execute(
+        "INSERT INTO balances (chat_id, income, expense) VALUES (%s, %s, %s) "
+        "ON CONFLICT (chat_id) DO UPDATE SET "
+        "income = balances.income + EXCLUDED.income, "
+        "expense = balances.expense + EXCLUDED.expense",
+        (chat_id, income, expense)
+    )
+    execute_values(
+        cursor,
+        "INSERT INTO monthly_balances (chat_id, month, income, expense) VALUES %s "
+        "ON CONFLICT (chat_id, month) DO UPDATE SET "
+        "income = monthly_balances.income + EXCLUDED.income, "
+        "expense = monthly_balances.expense + EXCLUDED.expense",
+        [(chat_id, month, values[0], values[1]) for month, values in monthly.items()]
+    )
+
+
+# Сохраняет операцию и обновляет агрегаты.
+# Вызывается внутри транзакции (через Database.run), поэтому операция
+# и итоги фиксируются или откатываются вместе.
+def insert_operation(cursor, date, amount, chat_id: int, type_operation: str):
+    cursor.execute(
+        "INSERT INTO operations (date, sum, chat_id, type_operation) VALUES (%s, %s, %s, %s)",
+        (date, amount, chat_id, type_operation)
+    )
+    totals = (amount, 0) if type_operation == "ДОХОД" else (0, amount)
+    add_to_balances(cursor, chat_id, {date.replace(day=1): totals})
+
+
+# Слой доступа к данным: пул соединений psycopg2 за ограниченным пулом потоков.
+# Число потоков равно размеру пула, поэтому каждый поток всегда получает
+# соединение и пул никогда не исчерпывается, а цикл событий aiogram
+# не блокируется медленными запросами.
+class Database:
+    def __init__(self, minconn: int = DB_POOL_MIN, maxconn: int = DB_POOL_MAX, **config):
+        self.minconn = minconn
+        self.maxconn = maxconn
+        self.config = config or DB_CONFIG
+        self._pool = None
+        self._executor = None
+        self._partitions = set()  # Месяцы, секции которых точно существуют
+
+    # Создаём соединения и потоки (вызывается при старте бота)
+    def start(self):
+        if self._pool is not None:
+            return
+        self._pool = ThreadedConnectionPool(
+            self.minconn, self.maxconn, connection_factory=PreparedConnection, **self.config
+        )
+        self._executor = ThreadPoolExecutor(
+            max_workers=self.maxconn,
+            thread_name_prefix="db"
+        )
+
+    # Закрываем все соединения (вызывается при остановке бота)
+    def close(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=True)
+            self._executor = None
+        if self._pool is not None:
+            self._pool.closeall()
+            self._pool = None
+
+    # Выполняет func(cursor, *args) в отдельной транзакции внутри потока
+    def _run_sync(self, func, *args):
+        conn = self._pool.getconn()
+        try:
+            # Блок with фиксирует транзакцию при успехе и откатывает при ошибке
+            with conn:
+                with conn.cursor() as cursor:
+                    return func(cursor, *args)
+        finally:
+            # Разорванное соединение не возвращаем в пул, а закрываем
+            self._pool.putconn(conn, close=bool(conn.closed))
+
+    # Выполняет func(conn, *args) в отдельной транзакции внутри потока
+    # (нужно, например, для именованных серверных курсоров)
+    def _run_on_connection_sync(self, func, *args):
+        conn = self._pool.getconn()
+        try:
+            with conn:
+                return func(conn, *args)
+        finally:
+            self._pool.putconn(conn, close=bool(conn.closed))
+
+    # Асинхронная обёртка: запрос выполняется в пуле потоков
+    async def run(self, func, *args):
+        return await self._submit(self._run_sync, func, *args)
+
+    # Асинхронная обёртка для функций, которым нужно само соединение
+    async def run_on_connection(self, func, *args):
+        return await self._submit(self._run_on_connection_sync, func, *args)
+
+    # Гарантирует, что для дат есть секции operations. Секции создаются
+    # отдельной транзакцией до вставки (откат вставки не откатит секцию),
+    # а уже проверенные месяцы запоминаются, поэтому обычно запроса нет вовсе.
+    async def ensure_partitions(self, dates, max_new: int = None):
+        months = {value.replace(day=1) for value in dates} - self._partitions
+        if months:
+            await self.run(create_partitions, sorted(months), max_new)
+            self._partitions.update(months)
+
+    # Выполняет func(cursor, *args), предварительно создав секции для dates.
+    # Кэш секций живёт в процессе: после partitions.py detach он ошибается,
+    # и вставка падает с "no partition of relation operations found for row"
+    # (нарушение ограничения CHECK). Тогда забываем эти месяцы, проверяем
+    # секции в базе заново и повторяем один раз.
+    async def run_with_partitions(self, dates, func, *args, max_new: int = None):
+        await self.ensure_partitions(dates, max_new)
+        try:
+            return await self.run(func, *args)
+        except errors.CheckViolation:
+            self._partitions.difference_update({value.replace(day=1) for value in dates})
+            await self.ensure_partitions(dates, max_new)
+            return await self.run(func, *args)
+
+    async def _submit(self, runner, func, *args):
+        if self._pool is None:
+            raise RuntimeError("Пул соединений не инициализирован")
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._executor, runner, func, *args)
+
+    # Запросы из реестра statements: name - имя запроса, params - словарь.
+    # Возвращает одну строку результата запроса
+    async def fetchone_prepared(self, name: str, params: dict):
+        def _fetchone(cursor):
+            statements.execute(cursor, name, params)
+            return cursor.fetchone()
+        return await self.run(_fetchone)
+
+    # Возвращает все строки результата запроса
+    async def fetchall_prepared(self, name: str, params: dict):
+        def _fetchall(cursor):
+            statements.execute(cursor, name, params)
+            return cursor.fetchall()
+        return await self.run(_fetchall)
+
+    # Выполняет изменяющий запрос и фиксирует транзакцию
+    async def execute_prepared(self, name: str, params: dict):
+        def _execute(cursor):
+            statements.execute(cursor, name, params)
+            return cursor.rowcount
+        return await self.run(_execute)
+
+
+# Общий экземпляр для всего бота
+db = Database()
@@ -0,0 +1,27 @@
+import os # Для доступа к переменным окружения
+import uvicorn # Асинхронный ASGI-сервер
+from asgiref.wsgi import WsgiToAsgi # Адаптер Flask (WSGI) -> ASGI
+from exchange_service import app # Тот же сервис курсов с теми же эндпоинтами
+
+# Производственный режим сервиса курсов: вместо однопоточного сервера
+# разработки Werkzeug с отладчиком - uvicorn с несколькими процессами
+# и keep-alive соединениями. Контракт /rate, /rates, /rates/history не меняется.
+asgi_app = WsgiToAsgi(app)
+
+# Параметры запуска задаются через переменные окружения
+HOST = os.getenv("EXCHANGE_SERVICE_HOST", "127.0.0.1")
+PORT = int(os.getenv("EXCHANGE_SERVICE_PORT", "5000"))
+WORKERS = int(os.getenv("EXCHANGE_SERVICE_WORKERS", str(os.cpu_count() or 1)))
+KEEP_ALIVE = int(os.getenv("EXCHANGE_SERVICE_KEEP_ALIVE", "30"))  # секунды
+
+
+if __name__ == '__main__':
+    # Несколько процессов требуют передать приложение строкой импорта
+    uvicorn.run(
+        "exchange_asgi:asgi_app",
+        host=HOST,
+        port=PORT,
+        workers=WORKERS,
+        timeout_keep_alive=KEEP_ALIVE,
+        log_level="warning"
+    )
@@ -1,3 +1,7 @@
+import json # Для вычисления версии таблицы курсов
+import hashlib # Для вычисления версии таблицы курсов
+from bisect import bisect_left, bisect_right # Двоичный поиск по датам
+from datetime import date # Даты курсов
 from flask import Flask, jsonify, request
 
 app = Flask(__name__)
@@ -8,6 +12,57 @@ EXCHANGE_RATES = {
     "EUR": 90.11  # 1 EUR = 90.11 RUB
 }
 
+# Дата, с которой действуют текущие курсы
+CURRENT_RATES_DATE = date(2025, 6, 1)
+
+# Исторические курсы: валюта -> список (дата начала действия, курс)
+HISTORICAL_RATES = {
+    "USD": [(date(2023, 1, 1), 70.34), (date(2024, 1, 1), 89.69), (date(2025, 1, 1), 101.68)],
+    "EUR": [(date(2023, 1, 1), 75.66), (date(2024, 1, 1), 99.19), (date(2025, 1, 1), 106.10)]
+}
+
+# Максимальное число пар (валюта, дата) в одном запросе
+MAX_HISTORY_ITEMS = 1000
+
+
+# Временной ряд курсов. Для каждой валюты хранится отсортированный список дат
+# и параллельный список курсов, поэтому курс на дату ищется двоичным поиском.
+# Курс действует с указанной даты до даты следующего значения.
+class RateHistory:
+    def __init__(self):
+        self._dates = {}  # валюта -> отсортированный список дат
+        self._rates = {}  # валюта -> курсы в порядке дат
+
+    # Добавляет (или заменяет) курс, действующий с указанной даты
+    def add(self, currency: str, since: date, rate: float):
+        dates = self._dates.setdefault(currency, [])
+        rates = self._rates.setdefault(currency, [])
+        index = bisect_left(dates, since)
+        if index < len(dates) and dates[index] == since:
+            rates[index] = rate
+        else:
+            dates.insert(index, since)
+            rates.insert(index, rate)
+
+    # Курс на дату или None, если валюта неизвестна или дата раньше первого значения
+    def get(self, currency: str, on_date: date):
+        dates = self._dates.get(currency)
+        if not dates:
+            return None
+        index = bisect_right(dates, on_date) - 1
+        if index < 0:
+            return None
+        return self._rates[currency][index]
+
+
+# Наполняем временной ряд историческими и текущими курсами
+RATE_HISTORY = RateHistory()
+for history_currency, points in HISTORICAL_RATES.items():
+    for since_date, history_rate in points:
+        RATE_HISTORY.add(history_currency, since_date, history_rate)
+for history_currency, history_rate in EXCHANGE_RATES.items():
+    RATE_HISTORY.add(history_currency, CURRENT_RATES_DATE, history_rate)
+
 
 # Обработчик запроса курса валюты
 @app.route('/rate', methods=['GET'])
@@ -27,6 +82,17 @@ def get_rate():
         if currency not in EXCHANGE_RATES:
             return jsonify({"message": "UNKNOWN CURRENCY"}), 400
 
+        # Необязательный параметр date (ГГГГ-ММ-ДД) - курс на указанную дату
+        date_str = request.args.get('date')
+        if date_str:
+            try:
+                rate = RATE_HISTORY.get(currency, date.fromisoformat(date_str))
+            except ValueError:
+                return jsonify({"message": "INVALID DATE"}), 400
+            if rate is None:
+                return jsonify({"message": "NO RATE FOR DATE"}), 404
+            return jsonify({"rate": rate}), 200
+
         # Возвращаем 200 статус со значением курса в теле
         return jsonify({"rate": EXCHANGE_RATES[currency]}), 200
 
@@ -36,6 +102,82 @@ def get_rate():
         return jsonify({"message": "UNEXPECTED ERROR"}), 500
 
 
+# Сколько секунд клиент может использовать полученную таблицу без перепроверки
+RATES_MAX_AGE = 60
+
+
+# Версия таблицы курсов: хэш её содержимого (меняется при любом изменении курса)
+def rates_version() -> str:
+    content = json.dumps(EXCHANGE_RATES, sort_keys=True).encode()
+    return hashlib.sha1(content).hexdigest()[:16]
+
+
+# Обработчик запроса всей таблицы курсов с поддержкой условного запроса
+@app.route('/rates', methods=['GET'])
+def get_rates():
+    try:
+        version = rates_version()
+
+        # Если у клиента актуальная версия - отвечаем 304 без тела
+        if request.if_none_match.contains_weak(version):
+            response = app.response_class(status=304)
+        else:
+            response = jsonify({"version": version, "rates": EXCHANGE_RATES})
+
+        response.set_etag(version)
+        response.cache_control.public = True
+        response.cache_control.max_age = RATES_MAX_AGE
+        return response
+
+    except Exception as e:
+        app.logger.error(f"Ошибка при обработке запроса: {e}")
+        return jsonify({"message": "UNEXPECTED ERROR"}), 500
+
+
+# Обработчик запроса курсов на даты: много пар (валюта, дата) за один вызов.
+# Тело: {"items": [{"currency": "USD", "date": "2024-05-01"}, ...]}
+# Ответ: {"rates": [{"currency": ..., "date": ..., "rate": ...} или {..., "error": ...}]}
+# в том же порядке; ошибка в одном элементе не мешает остальным.
+@app.route('/rates/history', methods=['POST'])
+def get_historical_rates():
+    data = request.get_json(silent=True) or {}
+    items = data.get("items")
+
+    if not isinstance(items, list):
+        return jsonify({"message": "MISSING ITEMS"}), 400
+    if len(items) > MAX_HISTORY_ITEMS:
+        return jsonify({"message": "TOO MANY ITEMS"}), 400
+
+    try:
+        results = []
+        for item in items:
+            currency = str(item.get("currency", "")).upper() if isinstance(item, dict) else ""
+            date_str = item.get("date") if isinstance(item, dict) else None
+            result = {"currency": currency, "date": date_str}
+            try:
+                on_date = date.fromisoformat(date_str)
+            except (TypeError, ValueError):
+                result["error"] = "INVALID DATE"
+                results.append(result)
+                continue
+
+            if currency not in EXCHANGE_RATES:
+                result["error"] = "UNKNOWN CURRENCY"
+            else:
+                rate = RATE_HISTORY.get(currency, on_date)
+                if rate is None:
+                    result["error"] = "NO RATE FOR DATE"
+                else:
+                    result["rate"] = rate
+            results.append(result)
+
+        return jsonify({"rates": results}), 200
+
+    except Exception as e:
+        app.logger.error(f"Ошибка при обработке запроса: {e}")
+        return jsonify({"message": "UNEXPECTED ERROR"}), 500
+
+
 if __name__ == '__main__':
     # Режим отладки для удобства
     app.run(debug=True)
@@ -0,0 +1,68 @@
+import os # Для работы с временными файлами
+import csv # Для записи CSV
+import tempfile # Временный файл выгрузки
+
+# Сколько строк читать из серверного курсора за один раз
+EXPORT_CHUNK_SIZE = 5000
+# Поддерживаемые форматы выгрузки
+EXPORT_FORMATS = ("csv", "xlsx")
+EXPORT_HEADER = ("Дата", "Сумма", "Тип")
+
+
+# Запись строк в CSV в формате, который понимает /import
+def write_csv(path: str, chunks):
+    with open(path, "w", encoding="utf-8-sig", newline="") as f:
+        writer = csv.writer(f, delimiter=";")
+        writer.writerow(EXPORT_HEADER)
+        for rows in chunks:
+            writer.writerows(
+                (date.strftime('%d.%m.%Y'), amount, op_type) for date, amount, op_type in rows
+            )
+
+
+# Запись строк в XLSX в потоковом режиме openpyxl (строки не хранятся в памяти)
+def write_xlsx(path: str, chunks):
+    from openpyxl import Workbook  # Необязательная зависимость, нужна только для XLSX
+
+    workbook = Workbook(write_only=True)
+    sheet = workbook.create_sheet("Операции")
+    sheet.append(EXPORT_HEADER)
+    for rows in chunks:
+        for date, amount, op_type in rows:
+            sheet.append((date, amount, op_type))
+    workbook.save(path)
+
+
+# Выгружаем все операции пользователя во временный файл и возвращаем путь к нему.
+# Строки читаются именованным (серверным) курсором порциями по EXPORT_CHUNK_SIZE,
+# поэтому расход памяти не зависит от числа операций.
+def export_operations(conn, chat_id: int, file_format: str) -> str:
+    if file_format not in EXPORT_FORMATS:
+        raise ValueError("Неизвестный формат выгрузки")
+
+    fd, path = tempfile.mkstemp(prefix="operations_", suffix=f".{file_format}")
+    os.close(fd)
+    try:
+        with conn.cursor(name=f"export_{chat_id}") as cursor:
+            cursor.itersize = EXPORT_CHUNK_SIZE
+            cursor.execute(
+                "SELECT date, sum, type_operation FROM operations "
+                "WHERE chat_id = %s ORDER BY date, id",
+                (chat_id,)
+            )
+
+            def chunks():
+                while True:
+                    rows = cursor.fetchmany(EXPORT_CHUNK_SIZE)
+                    if not rows:
+                        return
+                    yield rows
+
+            if file_format == "csv":
+                write_csv(path, chunks())
+            else:
+                write_xlsx(path, chunks())
+        return path
+    except Exception:
+        os.remove(path)
+        raise
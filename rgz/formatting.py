@@ -0,0 +1,59 @@
+from decimal import Decimal # Точная работа с суммами
+
+
+# Курс в виде несократимой дроби num/den
+def rate_fraction(rate) -> tuple:
+    num, den = Decimal(str(rate)).as_integer_ratio()
+    if num <= 0:
+        raise ValueError("Курс должен быть положительным")
+    return num, den
+
+
+# Пересчёт всей колонки сумм в другую валюту за один проход.
+# rate - один курс для всех сумм или список курсов для каждой суммы.
+# Суммы переводятся в копейки, курс - в несократимую дробь num/den,
+# поэтому деление выполняется в целых числах и округление до двух знаков
+# (половина - вверх) точное, без погрешностей float.
+# Возвращает строки вида "123.45".
+def convert_amounts(amounts, rate) -> list:
+    # Суммы из колонки DECIMAL(10, 2) переводим в целые копейки
+    cents = [int(amount * 100) for amount in amounts]
+
+    if isinstance(rate, (list, tuple)):
+        # Свой курс у каждой суммы: дробь считаем один раз на каждый курс
+        fractions = {value: rate_fraction(value) for value in set(rate)}
+        converted = [
+            (c * den + num // 2) // num
+            for c, (num, den) in zip(cents, map(fractions.__getitem__, rate))
+        ]
+    else:
+        num, den = rate_fraction(rate)
+        if num == den:
+            # Курс 1 (RUB): пересчёт не нужен
+            converted = cents
+        else:
+            # amount / rate = amount * den / num; +num//2 даёт округление половины вверх
+            half = num // 2
+            converted = [(c * den + half) // num for c in cents]
+
+    return [f"{c // 100}.{c % 100:02d}" for c in converted]
+
+
+# Формируем текст страницы с операциями: строки (id, дата, сумма, тип).
+# rate - один курс или словарь {дата: курс} для пересчёта по курсу на дату операции
+def format_operations(rows, currency: str, rate) -> str:
+    if not rows:
+        return ""
+    _, dates, amounts, types = zip(*rows)
+    if isinstance(rate, dict):
+        rate = [rate[date] for date in dates]
+    converted = convert_amounts(amounts, rate)
+
+    # Даты на странице часто повторяются, форматируем каждую один раз
+    date_strings = {date: date.strftime('%d.%m.%Y') for date in set(dates)}
+
+    suffix = f" {currency} - "
+    return "\n".join([
+        f"{date_strings[date]} - {amount}{suffix}{op_type}"
+        for date, amount, op_type in zip(dates, converted, types)
+    ])
@@ -0,0 +1,147 @@
+import io # Для потокового чтения файла и буфера COPY
+import csv # Для разбора CSV-выписок
+from datetime import date # Для разбора дат
+from decimal import Decimal, InvalidOperation, ROUND_HALF_UP # Точная работа с суммами
+from db import add_to_balances, is_valid_operation_date # Агрегаты баланса и диапазон дат
+
+# Названия типов операций, которые встречаются в выписках
+OPERATION_TYPES = {
+    "ДОХОД": "ДОХОД",
+    "ПОСТУПЛЕНИЕ": "ДОХОД",
+    "INCOME": "ДОХОД",
+    "РАСХОД": "РАСХОД",
+    "СПИСАНИЕ": "РАСХОД",
+    "EXPENSE": "РАСХОД"
+}
+# Максимальная сумма для колонки DECIMAL(10, 2)
+MAX_SUM = Decimal("99999999.99")
+# Сколько ошибок показывать пользователю
+MAX_ERRORS_SHOWN = 5
+
+
+# Разделитель колонок по первой строке файла.
+# csv.Sniffer при равных условиях выбирает запятую, а в выписках российских
+# банков разделитель - точка с запятой, а запятая - десятичная
+# (01.01.2024;1500,50;ДОХОД). Поэтому ";" и табуляция имеют приоритет.
+def detect_delimiter(sample: str) -> str:
+    first_line = sample.splitlines()[0] if sample else ""
+    for delimiter in (";", "\t"):
+        if delimiter in first_line:
+            return delimiter
+    return ","
+
+
+# Строка заголовка: первая ячейка не разбирается как дата
+def is_header(row: list) -> bool:
+    try:
+        parse_date(row[0].strip())
+    except ValueError:
+        return True
+    return False
+
+
+# Результат разбора выписки: строки для COPY, итоги по месяцам и ошибки
+class ImportResult:
+    def __init__(self):
+        self.accepted = 0
+        self.rejected = 0
+        self.errors = []  # Первые ошибки в виде "строка N: причина"
+        self.copy_buffer = io.StringIO()  # Принятые строки в текстовом формате COPY
+        self.monthly = {}  # {первое число месяца: [доходы, расходы]}
+
+    def reject(self, line_number: int, reason: str):
+        self.rejected += 1
+        if len(self.errors) < MAX_ERRORS_SHOWN:
+            self.errors.append(f"строка {line_number}: {reason}")
+
+
+# Разбор даты в одном из допустимых форматов.
+# Для ДД.ММ.ГГГГ и ГГГГ-ММ-ДД разбираем срезами: strptime заметно медленнее
+def parse_date(value: str):
+    try:
+        if len(value) == 10 and value[2] == "." and value[5] == ".":
+            return date(int(value[6:]), int(value[3:5]), int(value[:2]))
+        if len(value) == 10 and value[4] == "-" and value[7] == "-":
+            return date(int(value[:4]), int(value[5:7]), int(value[8:]))
+    except ValueError:
+        pass
+    raise ValueError("неверная дата")
+
+
+# Разбор суммы: допускаются запятая и пробелы между разрядами
+def parse_sum(value: str) -> Decimal:
+    try:
+        amount = Decimal(value.replace(" ", "").replace("\xa0", "").replace(",", "."))
+    except InvalidOperation:
+        raise ValueError("неверная сумма")
+    if not amount.is_finite():
+        raise ValueError("неверная сумма")
+    # Отрицательная сумма в выписке - это расход, знак учитывается в типе.
+    # Размер проверяем до округления: quantize для 1E+30 не умещается
+    # в точность Decimal и выбрасывает InvalidOperation
+    amount = abs(amount)
+    if amount > MAX_SUM + 1:
+        raise ValueError("сумма вне допустимого диапазона")
+    # Округление до копеек как в /add_operation и в колонке DECIMAL(10, 2)
+    amount = amount.quantize(Decimal("0.01"), rounding=ROUND_HALF_UP)
+    if amount == 0 or amount > MAX_SUM:
+        raise ValueError("сумма вне допустимого диапазона")
+    return amount
+
+
+# Потоковый разбор выписки. Ожидаемые колонки: дата (ДД.ММ.ГГГГ или ГГГГ-ММ-ДД); сумма; тип.
+# Если тип не указан, он определяется по знаку суммы.
+# Строки проверяются по одной и сразу записываются в буфер COPY,
+# поэтому весь файл не разбирается в список в памяти.
+def parse_statement(binary_file, chat_id: int) -> ImportResult:
+    result = ImportResult()
+    text = io.TextIOWrapper(binary_file, encoding="utf-8-sig", errors="replace", newline="")
+
+    # Определяем разделитель по началу файла
+    sample = text.read(4096)
+    text.seek(0)
+    delimiter = detect_delimiter(sample)
+
+    for line_number, row in enumerate(csv.reader(text, delimiter=delimiter), start=1):
+        # Пропускаем пустые строки
+        if not row or not any(cell.strip() for cell in row):
+            continue
+        try:
+            if len(row) < 2:
+                raise ValueError("ожидается минимум 2 колонки")
+            operation_date = parse_date(row[0].strip())
+            if not is_valid_operation_date(operation_date):
+                raise ValueError("дата вне допустимого диапазона")
+            raw_sum = row[1].strip()
+            amount = parse_sum(raw_sum)
+            if len(row) > 2 and row[2].strip():
+                type_operation = OPERATION_TYPES.get(row[2].strip().upper())
+                if type_operation is None:
+                    raise ValueError("неизвестный тип операции")
+            else:
+                type_operation = "РАСХОД" if raw_sum.startswith("-") else "ДОХОД"
+        except ValueError as e:
+            # Первая строка без даты считается заголовком
+            if line_number == 1 and is_header(row):
+                continue
+            result.reject(line_number, str(e))
+            continue
+
+        result.accepted += 1
+        result.copy_buffer.write(f"{operation_date.isoformat()}\t{amount}\t{chat_id}\t{type_operation}\n")
+        totals = result.monthly.setdefault(operation_date.replace(day=1), [Decimal(0), Decimal(0)])
+        totals[0 if type_operation == "ДОХОД" else 1] += amount
+
+    result.copy_buffer.seek(0)
+    return result
+
+
+# Загружает принятые строки одним COPY и обновляет агрегаты (в одной транзакции)
+def load_statement(cursor, chat_id: int, result: ImportResult):
+    # Буфер читается с начала и при повторной попытке
+    result.copy_buffer.seek(0)
+    cursor.copy_expert(
+        "COPY operations (date, sum, chat_id, type_operation) FROM STDIN",
+        result.copy_buffer
+    )
+    add_to_balances(cursor, chat_id, {month: tuple(values) for month, values in result.monthly.items()})
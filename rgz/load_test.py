@@ -0,0 +1,141 @@
+import os # Для доступа к переменным окружения
+import sys # Для чтения аргументов командной строки
+import time # Для замера задержек
+import asyncio # Для одновременной работы пользователей
+from collections import Counter, defaultdict # Счётчики вызовов и задержек
+from datetime import datetime # Дата сообщений
+
+# Токен нужен только для создания объекта Bot: запросы в Telegram не отправляются
+os.environ.setdefault("API_TOKEN", "123456789:LOAD-TEST")
+
+from aiogram import types # Типы Telegram
+from aiogram.client.session.base import BaseSession # Базовый класс HTTP-сессии бота
+from aiogram.methods import SendMessage, EditMessageText # Методы, возвращающие сообщение
+import bot as bot_module # Тестируемый бот (диспетчер и обработчики)
+from db import db # Пул соединений для очистки тестовых данных
+
+# Начало диапазона chat_id тестовых пользователей (очищается до и после прогона)
+BASE_CHAT_ID = 9_000_000_000
+
+
+# Сессия бота, которая записывает исходящие вызовы вместо запросов к Telegram
+class RecordingSession(BaseSession):
+    def __init__(self):
+        super().__init__()
+        self.calls = Counter()  # имя метода -> число вызовов
+        self.message_id = 0
+
+    async def make_request(self, bot, method, timeout=None):
+        self.calls[type(method).__name__] += 1
+        if isinstance(method, (SendMessage, EditMessageText)):
+            self.message_id += 1
+            return types.Message(
+                message_id=self.message_id,
+                date=datetime.now(),
+                chat=types.Chat(id=method.chat_id, type="private"),
+                text=method.text
+            )
+        return True
+
+    async def stream_content(self, *args, **kwargs):
+        yield b""
+
+    async def close(self):
+        pass
+
+
+# Синтетический апдейт с текстовым сообщением от пользователя
+def make_update(update_id: int, chat_id: int, text: str) -> types.Update:
+    return types.Update(
+        update_id=update_id,
+        message=types.Message(
+            message_id=update_id,
+            date=datetime.now(),
+            chat=types.Chat(id=chat_id, type="private"),
+            from_user=types.User(id=chat_id, is_bot=False, first_name="load"),
+            text=text
+        )
+    )
+
+
+# Нагрузочный прогон: каждый пользователь последовательно проходит сценарии,
+# пользователи работают одновременно
+class LoadTest:
+    def __init__(self, users: int, operations: int):
+        self.users = users
+        self.operations = operations
+        self.update_id = 0
+        self.latencies = defaultdict(list)  # сценарий -> задержки в секундах
+
+    # Передаём апдейт в диспетчер и замеряем время обработки
+    async def send(self, flow: str, chat_id: int, text: str):
+        self.update_id += 1
+        update = make_update(self.update_id, chat_id, text)
+        started = time.perf_counter()
+        await bot_module.dp.feed_update(bot_module.bot, update)
+        self.latencies[flow].append(time.perf_counter() - started)
+
+    # Сценарии одного пользователя: /reg, /add_operation, /operations
+    async def simulate_user(self, index: int):
+        chat_id = BASE_CHAT_ID + index
+        for text in ("/reg", f"load_user_{index}"):
+            await self.send("/reg", chat_id, text)
+        for i in range(self.operations):
+            for text in ("/add_operation", "ДОХОД" if i % 2 else "РАСХОД",
+                         f"{100 + i}.50", f"{1 + i % 28:02d}.{1 + i % 12:02d}.2025"):
+                await self.send("/add_operation", chat_id, text)
+        for text in ("/operations", "ДАТА", "ПО УБЫВАНИЮ", "RUB"):
+            await self.send("/operations", chat_id, text)
+
+    async def run(self) -> float:
+        started = time.perf_counter()
+        await asyncio.gather(*(self.simulate_user(i) for i in range(self.users)))
+        return time.perf_counter() - started
+
+
+# Перцентиль по отсортированному списку
+def percentile(values: list, p: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * p / 100))]
+
+
+# Удаляем тестовых пользователей (операции и итоги удаляются каскадно)
+def cleanup(cursor, users: int):
+    cursor.execute(
+        "DELETE FROM users WHERE chat_id >= %s AND chat_id < %s",
+        (BASE_CHAT_ID, BASE_CHAT_ID + users)
+    )
+
+
+async def main(users: int, operations: int):
+    session = RecordingSession()
+    bot_module.bot.session = session
+    await bot_module.dp.emit_startup()
+    try:
+        await db.run(cleanup, users)
+        load_test = LoadTest(users, operations)
+        elapsed = await load_test.run()
+    finally:
+        await db.run(cleanup, users)
+        await bot_module.dp.emit_shutdown()
+
+    total = sum(len(values) for values in load_test.latencies.values())
+    print(f"Пользователей: {users}, операций на пользователя: {operations}")
+    print(f"Апдейтов: {total} за {elapsed:.2f} с ({total / elapsed:.1f} апдейтов/с)")
+    print(f"{'сценарий':16} {'апдейтов':>9} {'p50, мс':>9} {'p95, мс':>9} {'p99, мс':>9}")
+    all_latencies = []
+    for flow, values in load_test.latencies.items():
+        all_latencies.extend(values)
+        print(f"{flow:16} {len(values):>9} {percentile(values, 50) * 1000:>9.2f} "
+              f"{percentile(values, 95) * 1000:>9.2f} {percentile(values, 99) * 1000:>9.2f}")
+    print(f"{'всего':16} {len(all_latencies):>9} {percentile(all_latencies, 50) * 1000:>9.2f} "
+          f"{percentile(all_latencies, 95) * 1000:>9.2f} {percentile(all_latencies, 99) * 1000:>9.2f}")
+    print(f"Исходящие вызовы: {dict(session.calls)}")
+
+
+if __name__ == "__main__":
+    # Использование: python load_test.py [пользователей] [операций на пользователя]
+    # Нужна локальная PostgreSQL с базой rpp_rgz (см. DB.sql и migrate.py)
+    users_count = int(sys.argv[1]) if len(sys.argv) > 1 else 100
+    operations_count = int(sys.argv[2]) if len(sys.argv) > 2 else 5
+    asyncio.run(main(users_count, operations_count))
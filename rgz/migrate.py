@@ -0,0 +1,130 @@
+import os # Для работы с путями к файлам миграций
+import re # Для разбора имён файлов миграций
+import sys # Для чтения аргументов командной строки
+import json # Для разбора плана запроса
+import psycopg2 # Для работы с PostgreSQL
+from db import DB_CONFIG, SORT_COLUMNS, SORT_DIRECTIONS, operations_page_query
+
+# Каталог с SQL-файлами миграций вида 0001_описание.sql
+MIGRATIONS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "migrations")
+MIGRATION_FILE = re.compile(r"^(\d+)_(\w+)\.sql$")
+
+
+# Создаём таблицу для учёта применённых миграций
+def ensure_migrations_table(cursor):
+    cursor.execute(
+        "CREATE TABLE IF NOT EXISTS schema_migrations ("
+        "version INTEGER PRIMARY KEY, "
+        "name VARCHAR(200) NOT NULL, "
+        "applied_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP)"
+    )
+
+
+# Список миграций из каталога, упорядоченный по номеру версии
+def load_migrations():
+    migrations = []
+    for filename in os.listdir(MIGRATIONS_DIR):
+        match = MIGRATION_FILE.match(filename)
+        if match:
+            migrations.append((int(match.group(1)), match.group(2), os.path.join(MIGRATIONS_DIR, filename)))
+    return sorted(migrations)
+
+
+# Номера уже применённых миграций
+def applied_versions(cursor) -> set:
+    cursor.execute("SELECT version FROM schema_migrations")
+    return {row[0] for row in cursor.fetchall()}
+
+
+# Применяем все новые миграции, каждую в своей транзакции
+def migrate(conn):
+    with conn:
+        with conn.cursor() as cursor:
+            ensure_migrations_table(cursor)
+            applied = applied_versions(cursor)
+
+    for version, name, path in load_migrations():
+        if version in applied:
+            continue
+        with open(path, encoding="utf-8") as f:
+            sql = f.read()
+        # Миграция и запись о ней фиксируются вместе
+        with conn:
+            with conn.cursor() as cursor:
+                cursor.execute(sql)
+                cursor.execute(
+                    "INSERT INTO schema_migrations (version, name) VALUES (%s, %s)",
+                    (version, name)
+                )
+        print(f"Применена миграция {version:04d}_{name}")
+
+
+# Выводим состояние миграций
+def status(conn):
+    with conn:
+        with conn.cursor() as cursor:
+            ensure_migrations_table(cursor)
+            applied = applied_versions(cursor)
+    for version, name, _ in load_migrations():
+        mark = "✔" if version in applied else " "
+        print(f"[{mark}] {version:04d}_{name}")
+
+
+# Все узлы плана запроса (обход дерева)
+def plan_nodes(plan: dict) -> list:
+    nodes = [plan]
+    for child in plan.get("Plans", []):
+        nodes.extend(plan_nodes(child))
+    return nodes
+
+
+# Проверяем, что планировщик использует индексы для всех вариантов /operations.
+# На маленькой тестовой базе последовательное чтение дешевле индекса,
+# поэтому флаг --no-seqscan запрещает его на время проверки.
+def explain(conn, chat_id: int, no_seqscan: bool = False):
+    ok = True
+    with conn:
+        with conn.cursor() as cursor:
+            if no_seqscan:
+                cursor.execute("SET LOCAL enable_seqscan = off")
+            for column in SORT_COLUMNS:
+                for direction in SORT_DIRECTIONS:
+                    cursor.execute(
+                        "EXPLAIN (FORMAT JSON) " + operations_page_query(column, direction),
+                        {"chat_id": chat_id, "limit": 21}
+                    )
+                    plan = cursor.fetchone()[0]
+                    if isinstance(plan, str):
+                        plan = json.loads(plan)
+                    nodes = plan_nodes(plan[0]["Plan"])
+                    scans = [
+                        f"{node['Node Type']} ({node.get('Index Name', node['Relation Name'])})"
+                        for node in nodes if "Relation Name" in node
+                    ]
+                    # Индекс подходит, если нет ни последовательного чтения, ни сортировки
+                    uses_index = not any(
+                        node["Node Type"] in ("Seq Scan", "Sort") for node in nodes
+                    )
+                    ok = ok and uses_index
+                    print(f"{'OK ' if uses_index else 'NO '} {column} {direction}: {', '.join(scans)}")
+    return ok
+
+
+if __name__ == "__main__":
+    # Команды: migrate (по умолчанию), status, explain <chat_id> [--no-seqscan]
+    command = sys.argv[1] if len(sys.argv) > 1 else "migrate"
+    connection = psycopg2.connect(**DB_CONFIG)
+    try:
+        if command == "migrate":
+            migrate(connection)
+        elif command == "status":
+            status(connection)
+        elif command == "explain":
+            target_chat_id = int(sys.argv[2]) if len(sys.argv) > 2 else 0
+            if not explain(connection, target_chat_id, no_seqscan="--no-seqscan" in sys.argv):
+                sys.exit(1)
+        else:
+            print("Использование: python migrate.py [migrate | status | explain <chat_id> [--no-seqscan]]")
+            sys.exit(2)
+    finally:
+        connection.close()
@@ -0,0 +1,11 @@
+-- Составные индексы для запросов /operations: фильтр по chat_id
+-- и сортировка по выбранной колонке, затем по id (keyset-пагинация).
+-- Индекс по возрастанию обслуживает и сортировку по убыванию (обратный проход).
+CREATE INDEX IF NOT EXISTS operations_chat_id_date_idx
+    ON operations (chat_id, date, id);
+
+CREATE INDEX IF NOT EXISTS operations_chat_id_sum_idx
+    ON operations (chat_id, sum, id);
+
+CREATE INDEX IF NOT EXISTS operations_chat_id_type_operation_idx
+    ON operations (chat_id, type_operation, id);
@@ -0,0 +1,36 @@
+-- Агрегаты по операциям пользователя, обновляются в той же транзакции,
+-- что и вставка операции, поэтому /balance читает одну строку.
+
+-- Итог за всё время
+CREATE TABLE IF NOT EXISTS balances (
+    chat_id BIGINT PRIMARY KEY REFERENCES users(chat_id) ON DELETE CASCADE,
+    income DECIMAL(14, 2) NOT NULL DEFAULT 0,   -- Сумма доходов
+    expense DECIMAL(14, 2) NOT NULL DEFAULT 0   -- Сумма расходов
+);
+
+-- Итог по месяцам (month - первое число месяца)
+CREATE TABLE IF NOT EXISTS monthly_balances (
+    chat_id BIGINT NOT NULL REFERENCES users(chat_id) ON DELETE CASCADE,
+    month DATE NOT NULL,
+    income DECIMAL(14, 2) NOT NULL DEFAULT 0,
+    expense DECIMAL(14, 2) NOT NULL DEFAULT 0,
+    PRIMARY KEY (chat_id, month)
+);
+
+-- Заполняем агрегаты по уже существующим операциям
+INSERT INTO balances (chat_id, income, expense)
+SELECT chat_id,
+       COALESCE(SUM(sum) FILTER (WHERE type_operation = 'ДОХОД'), 0),
+       COALESCE(SUM(sum) FILTER (WHERE type_operation = 'РАСХОД'), 0)
+FROM operations
+GROUP BY chat_id
+ON CONFLICT (chat_id) DO NOTHING;
+
+INSERT INTO monthly_balances (chat_id, month, income, expense)
+SELECT chat_id,
+       date_trunc('month', date)::date,
+       COALESCE(SUM(sum) FILTER (WHERE type_operation = 'ДОХОД'), 0),
+       COALESCE(SUM(sum) FILTER (WHERE type_operation = 'РАСХОД'), 0)
+FROM operations
+GROUP BY chat_id, date_trunc('month', date)
+ON CONFLICT (chat_id, month) DO NOTHING;
@@ -0,0 +1,58 @@
+-- Секционирование operations по диапазонам date (одна секция на месяц).
+-- Старые секции можно отсоединить для архивации (python partitions.py detach ГГГГ-ММ)
+-- вместо DELETE, а запросы с условием по дате читают только нужные секции.
+
+-- Создание секции для месяца, в который попадает дата (если её ещё нет)
+CREATE OR REPLACE FUNCTION ensure_operations_partition(month_date DATE) RETURNS void AS $$
+DECLARE
+    start_date DATE := date_trunc('month', month_date)::date;
+BEGIN
+    EXECUTE format(
+        'CREATE TABLE IF NOT EXISTS %I PARTITION OF operations FOR VALUES FROM (%L) TO (%L)',
+        'operations_' || to_char(start_date, 'YYYY_MM'),
+        start_date,
+        (start_date + INTERVAL '1 month')::date
+    );
+EXCEPTION
+    -- Секцию одновременно создал другой процесс
+    WHEN duplicate_table THEN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+-- Обычную таблицу нельзя сделать секционированной: создаём новую и переносим строки
+ALTER TABLE operations RENAME TO operations_old;
+ALTER TABLE operations_old RENAME CONSTRAINT operations_pkey TO operations_old_pkey;
+
+CREATE TABLE operations (
+    id INTEGER NOT NULL DEFAULT nextval('operations_id_seq'),
+    date DATE NOT NULL,              -- Дата операции (ключ секционирования)
+    sum DECIMAL(10, 2) NOT NULL,     -- Сумма операции
+    chat_id BIGINT NOT NULL,         -- Ссылка на пользователя (идентификатор чата)
+    type_operation VARCHAR(10) NOT NULL CHECK (type_operation IN ('ДОХОД', 'РАСХОД')),  -- Тип операции
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,  -- Дата создания записи
+    -- Первичный ключ секционированной таблицы обязан включать ключ секционирования
+    PRIMARY KEY (id, date),
+    FOREIGN KEY (chat_id) REFERENCES users(chat_id) ON DELETE CASCADE
+) PARTITION BY RANGE (date);
+
+-- Последовательность id теперь принадлежит новой таблице
+ALTER SEQUENCE operations_id_seq OWNED BY operations.id;
+
+-- Секции для месяцев с существующими операциями, текущего и трёх следующих
+SELECT ensure_operations_partition(month)
+FROM (
+    SELECT DISTINCT date_trunc('month', date)::date AS month FROM operations_old
+    UNION
+    SELECT (date_trunc('month', CURRENT_DATE) + make_interval(months => n))::date
+    FROM generate_series(0, 3) AS n
+) AS months;
+
+INSERT INTO operations (id, date, sum, chat_id, type_operation, created_at)
+SELECT id, date, sum, chat_id, type_operation, created_at FROM operations_old;
+
+DROP TABLE operations_old;
+
+-- Индексы из 0001 создаются заново на секционированной таблице (и на каждой секции)
+CREATE INDEX operations_chat_id_date_idx ON operations (chat_id, date, id);
+CREATE INDEX operations_chat_id_sum_idx ON operations (chat_id, sum, id);
+CREATE INDEX operations_chat_id_type_operation_idx ON operations (chat_id, type_operation, id);
@@ -0,0 +1,126 @@
+import time # Для учёта времени в корзинах токенов
+import asyncio # Для ожидания своей очереди на отправку
+import logging # Для записи событий (логирования)
+from collections import deque # Последние времена ожидания
+from aiogram.client.session.middlewares.base import BaseRequestMiddleware # Middleware исходящих запросов
+from aiogram.exceptions import TelegramRetryAfter # Ответ 429 от Telegram
+from aiogram.methods import SetMyCommands # Установка меню команд
+from cache import TTLCache # Кэш последних отправленных меню
+
+logger = logging.getLogger(__name__)
+
+
+# Корзина токенов: rate токенов в секунду, не больше capacity подряд.
+# reserve() сразу занимает токен (допуская долг) и возвращает, сколько ждать,
+# поэтому ожидающие обслуживаются строго в порядке очереди.
+class TokenBucket:
+    def __init__(self, rate: float, capacity: float):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+
+    def reserve(self) -> float:
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        self.tokens -= 1
+        return 0.0 if self.tokens >= 0 else -self.tokens / self.rate
+
+    # Приостанавливаем корзину на delay секунд (после ответа 429)
+    def pause(self, delay: float):
+        self.tokens = min(self.tokens, 0) - delay * self.rate
+
+    def is_full(self) -> bool:
+        return self.tokens + (time.monotonic() - self.updated) * self.rate >= self.capacity
+
+
+# Планировщик исходящих запросов к Telegram (middleware сессии бота).
+# - Запросы в чаты проходят через общую корзину и корзину чата,
+#   поэтому бот не превышает лимиты Telegram и не получает 429.
+# - На 429 запрос повторяется после retry_after, а общая корзина
+#   приостанавливается, чтобы остальные запросы не устроили шторм повторов.
+# - Повторный set_my_commands с тем же меню для того же чата не отправляется.
+class OutboundScheduler(BaseRequestMiddleware):
+    def __init__(self, global_rate: float = 30.0, chat_rate: float = 1.0,
+                 chat_burst: float = 3.0, max_retries: int = 3):
+        self.global_bucket = TokenBucket(global_rate, global_rate)
+        self.chat_rate = chat_rate
+        self.chat_burst = chat_burst
+        self.max_retries = max_retries
+        self.chat_buckets = {}  # chat_id -> корзина чата
+        self.commands_cache = TTLCache(maxsize=100000, ttl=24 * 3600)  # (чат, язык) -> меню
+        # Метрики
+        self.waiting = 0  # Запросов в очереди на отправку
+        self.sent = 0
+        self.coalesced = 0  # Пропущенных повторных set_my_commands
+        self.retries = 0  # Повторов после 429
+        self.wait_times = deque(maxlen=1000)  # Последние времена ожидания, секунды
+
+    def _chat_bucket(self, chat_id) -> TokenBucket:
+        bucket = self.chat_buckets.get(chat_id)
+        if bucket is None:
+            # Удаляем корзины давно неактивных чатов (они полные)
+            if len(self.chat_buckets) >= 10000:
+                self.chat_buckets = {
+                    key: value for key, value in self.chat_buckets.items() if not value.is_full()
+                }
+            bucket = self.chat_buckets[chat_id] = TokenBucket(self.chat_rate, self.chat_burst)
+        return bucket
+
+    # Ждём своей очереди в корзине чата, затем в общей корзине
+    async def _throttle(self, chat_id):
+        started = time.monotonic()
+        self.waiting += 1
+        try:
+            delay = self._chat_bucket(chat_id).reserve()
+            if delay:
+                await asyncio.sleep(delay)
+            delay = self.global_bucket.reserve()
+            if delay:
+                await asyncio.sleep(delay)
+        finally:
+            self.waiting -= 1
+            self.wait_times.append(time.monotonic() - started)
+
+    async def __call__(self, make_request, bot, method):
+        # Меню команд отправляем, только если оно изменилось
+        commands_key = None
+        if isinstance(method, SetMyCommands):
+            commands_key = (getattr(method.scope, "chat_id", None), method.language_code)
+            commands = tuple((command.command, command.description) for command in method.commands)
+            if self.commands_cache.get(commands_key) == commands:
+                self.coalesced += 1
+                return True
+
+        # Лимиты относятся к запросам в конкретный чат; getUpdates и т.п. не задерживаем
+        chat_id = getattr(method, "chat_id", None)
+        for attempt in range(self.max_retries + 1):
+            if chat_id is not None:
+                await self._throttle(chat_id)
+            try:
+                result = await make_request(bot, method)
+                break
+            except TelegramRetryAfter as e:
+                if attempt == self.max_retries:
+                    raise
+                self.retries += 1
+                logger.warning(f"Telegram просит подождать {e.retry_after} с")
+                self.global_bucket.pause(e.retry_after)
+                await asyncio.sleep(e.retry_after)
+
+        self.sent += 1
+        if commands_key is not None:
+            self.commands_cache.set(commands_key, commands)
+        return result
+
+    def stats(self) -> dict:
+        waits = sorted(self.wait_times)
+        return {
+            "queued": self.waiting,
+            "sent": self.sent,
+            "coalesced": self.coalesced,
+            "retries": self.retries,
+            "wait_p50_ms": round(waits[len(waits) // 2] * 1000, 1) if waits else 0.0,
+            "wait_p95_ms": round(waits[int(len(waits) * 0.95)] * 1000, 1) if waits else 0.0
+        }
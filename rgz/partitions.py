@@ -0,0 +1,82 @@
+import re # Для разбора месяца в аргументах
+import sys # Для чтения аргументов командной строки
+from datetime import date # Первое число месяца секции
+import psycopg2 # Для работы с PostgreSQL
+from psycopg2 import sql # Безопасная подстановка имён таблиц
+from db import DB_CONFIG, create_partitions
+
+MONTH_ARGUMENT = re.compile(r"^(\d{4})-(\d{2})$")
+
+
+# Имя секции operations для месяца
+def partition_name(month: date) -> str:
+    return f"operations_{month.year:04d}_{month.month:02d}"
+
+
+# Первое число месяца, сдвинутое на offset месяцев
+def add_months(month: date, offset: int) -> date:
+    index = month.year * 12 + month.month - 1 + offset
+    return date(index // 12, index % 12 + 1, 1)
+
+
+# Выводим секции operations с границами и примерным числом строк
+def list_partitions(conn):
+    with conn:
+        with conn.cursor() as cursor:
+            cursor.execute(
+                "SELECT child.relname, pg_get_expr(child.relpartbound, child.oid), child.reltuples "
+                "FROM pg_inherits "
+                "JOIN pg_class parent ON parent.oid = pg_inherits.inhparent "
+                "JOIN pg_class child ON child.oid = pg_inherits.inhrelid "
+                "WHERE parent.relname = 'operations' "
+                "ORDER BY child.relname"
+            )
+            for name, bound, rows in cursor.fetchall():
+                print(f"{name}: {bound}, ~{max(int(rows), 0)} строк")
+
+
+# Создаём секции на текущий и months следующих месяцев
+def ensure(conn, months: int):
+    start = date.today().replace(day=1)
+    with conn:
+        with conn.cursor() as cursor:
+            create_partitions(cursor, [add_months(start, i) for i in range(months + 1)])
+    print(f"Секции созданы до {partition_name(add_months(start, months))} включительно")
+
+
+# Отсоединяем секцию месяца и переименовываем её в архивную таблицу.
+# DETACH ... CONCURRENTLY не блокирует запросы к operations, но не может
+# выполняться внутри транзакции, поэтому соединение переводится в autocommit.
+# Строки остаются в таблице operations_archive_ГГГГ_ММ: её можно выгрузить
+# (pg_dump -t) и удалить через DROP TABLE без долгого DELETE.
+def detach(conn, month: date):
+    name = partition_name(month)
+    archive = name.replace("operations_", "operations_archive_", 1)
+    conn.autocommit = True
+    with conn.cursor() as cursor:
+        cursor.execute(sql.SQL("ALTER TABLE operations DETACH PARTITION {} CONCURRENTLY").format(
+            sql.Identifier(name)
+        ))
+        cursor.execute(sql.SQL("ALTER TABLE {} RENAME TO {}").format(
+            sql.Identifier(name), sql.Identifier(archive)
+        ))
+    print(f"Секция {name} отсоединена и переименована в {archive}")
+
+
+if __name__ == "__main__":
+    # Команды: list (по умолчанию), ensure [месяцев вперёд], detach ГГГГ-ММ
+    command = sys.argv[1] if len(sys.argv) > 1 else "list"
+    connection = psycopg2.connect(**DB_CONFIG)
+    try:
+        if command == "list":
+            list_partitions(connection)
+        elif command == "ensure":
+            ensure(connection, int(sys.argv[2]) if len(sys.argv) > 2 else 3)
+        elif command == "detach" and len(sys.argv) > 2 and MONTH_ARGUMENT.match(sys.argv[2]):
+            year, month_number = MONTH_ARGUMENT.match(sys.argv[2]).groups()
+            detach(connection, date(int(year), int(month_number), 1))
+        else:
+            print("Использование: python partitions.py [list | ensure [месяцев] | detach ГГГГ-ММ]")
+            sys.exit(2)
+    finally:
+        connection.close()
@@ -0,0 +1,105 @@
+import sys # Для чтения аргументов командной строки
+import json # Формат записанных апдейтов (по одному JSON на строку)
+import time # Для замера времени
+import asyncio # Для одновременной отправки
+from collections import defaultdict # Группировка апдейтов по чатам
+from datetime import datetime # Дата сообщений
+import aiohttp # Асинхронный HTTP-клиент
+
+# Начало диапазона chat_id синтетических пользователей
+BASE_CHAT_ID = 9_000_000_000
+
+
+# Генерация записи апдейтов: сценарии /reg, /add_operation и /operations
+def generate(path: str, users: int, operations: int):
+    update_id = 0
+    now = int(datetime.now().timestamp())
+    with open(path, "w", encoding="utf-8") as f:
+        for index in range(users):
+            chat_id = BASE_CHAT_ID + index
+            texts = ["/reg", f"replay_user_{index}"]
+            for i in range(operations):
+                texts += ["/add_operation", "ДОХОД" if i % 2 else "РАСХОД",
+                          f"{100 + i}.50", f"{1 + i % 28:02d}.{1 + i % 12:02d}.2025"]
+            texts += ["/operations", "ДАТА", "ПО УБЫВАНИЮ", "RUB"]
+            for text in texts:
+                update_id += 1
+                f.write(json.dumps({
+                    "update_id": update_id,
+                    "message": {
+                        "message_id": update_id,
+                        "date": now,
+                        "chat": {"id": chat_id, "type": "private"},
+                        "from": {"id": chat_id, "is_bot": False, "first_name": "replay"},
+                        "text": text
+                    }
+                }, ensure_ascii=False) + "\n")
+    print(f"Записано {update_id} апдейтов в {path}")
+
+
+# Ждём, пока все отправленные апдейты будут обработаны процессами
+async def wait_processed(session, base_url: str, expected: int) -> dict:
+    while True:
+        async with session.get(f"{base_url}/stats") as response:
+            stats = await response.json()
+        if sum(stats["processed"]) >= expected:
+            return stats
+        await asyncio.sleep(0.05)
+
+
+# Отправляем апдейты на webhook: чаты - параллельно, апдейты одного чата - по порядку.
+# Время считается до момента, когда все апдейты обработаны, а не только приняты.
+async def replay(base_url: str, path: str, concurrency: int):
+    per_chat = defaultdict(list)
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            update = json.loads(line)
+            message = update.get("message") or {}
+            per_chat[message.get("chat", {}).get("id", 0)].append(update)
+    total = sum(len(updates) for updates in per_chat.values())
+
+    limit = asyncio.Semaphore(concurrency)
+    rejected = 0
+
+    async def send_chat(session, updates):
+        nonlocal rejected
+        async with limit:
+            for update in updates:
+                # 503 - очередь обработчика переполнена, повторяем как Telegram
+                while True:
+                    async with session.post(f"{base_url}/webhook", json=update) as response:
+                        if response.status != 503:
+                            break
+                    rejected += 1
+                    await asyncio.sleep(0.05)
+
+    async with aiohttp.ClientSession() as session:
+        async with session.get(f"{base_url}/stats") as response:
+            before = sum((await response.json())["processed"])
+        started = time.perf_counter()
+        await asyncio.gather(*(send_chat(session, updates) for updates in per_chat.values()))
+        stats = await wait_processed(session, base_url, before + total)
+        elapsed = time.perf_counter() - started
+
+    print(f"{base_url}: обработчиков {stats['workers']}, апдейтов {total}, "
+          f"{elapsed:.2f} с, {total / elapsed:.1f} апдейтов/с, повторов после 503: {rejected}")
+
+
+if __name__ == "__main__":
+    # Использование:
+    #   python replay_updates.py generate updates.jsonl [пользователей] [операций]
+    #   python replay_updates.py replay updates.jsonl [URL] [одновременных чатов]
+    # Для замера масштабирования запускайте webhook.py с WEBHOOK_DRY_RUN=1
+    # и WEBHOOK_WORKERS=1, 2, ..., N и повторяйте replay для каждого значения.
+    command = sys.argv[1] if len(sys.argv) > 1 else ""
+    if command == "generate":
+        generate(sys.argv[2],
+                 int(sys.argv[3]) if len(sys.argv) > 3 else 200,
+                 int(sys.argv[4]) if len(sys.argv) > 4 else 5)
+    elif command == "replay":
+        asyncio.run(replay(sys.argv[3] if len(sys.argv) > 3 else "http://127.0.0.1:8080",
+                           sys.argv[2],
+                           int(sys.argv[4]) if len(sys.argv) > 4 else 100))
+    else:
+        print("Использование: python replay_updates.py generate|replay updates.jsonl ...")
+        sys.exit(2)
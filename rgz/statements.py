@@ -0,0 +1,64 @@
+import re # Для замены именованных параметров на позиционные
+import threading # Счётчики обновляются из потоков пула
+from psycopg2.extensions import connection as BaseConnection # Базовый класс соединения
+
+# Именованный параметр psycopg2: %(имя)s
+NAMED_PARAMETER = re.compile(r"%\((\w+)\)s")
+
+
+# Соединение, которое помнит, какие запросы на нём уже подготовлены.
+# Подготовленные запросы живут до закрытия соединения и не откатываются
+# вместе с транзакцией, поэтому набор имён хранится на самом соединении.
+class PreparedConnection(BaseConnection):
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.prepared = set()
+
+
+# Реестр фиксированных запросов бота.
+# Каждый запрос регистрируется один раз под своим именем с именованными
+# параметрами %(имя)s. При первом использовании на соединении выполняется
+# PREPARE (разбор и анализ запроса), дальше - только EXECUTE, и сервер
+# не разбирает текст запроса заново при каждом вызове.
+class StatementRegistry:
+    def __init__(self):
+        self._statements = {}  # имя -> (текст PREPARE, текст EXECUTE)
+        self._lock = threading.Lock()
+        self.prepares = 0  # Выполнено PREPARE (по одному на запрос и соединение)
+        self.executions = 0
+
+    def register(self, name: str, query: str):
+        if not name.isidentifier():
+            raise ValueError(f"Недопустимое имя запроса: {name}")
+        # Одинаковые имена получают один номер: %(value)s может встречаться дважды
+        names = list(dict.fromkeys(NAMED_PARAMETER.findall(query)))
+        positional = NAMED_PARAMETER.sub(lambda match: f"${names.index(match.group(1)) + 1}", query)
+        arguments = ", ".join(f"%({parameter})s" for parameter in names)
+        self._statements[name] = (
+            f"PREPARE {name} AS {positional}",
+            f"EXECUTE {name} ({arguments})" if names else f"EXECUTE {name}"
+        )
+
+    # Текст EXECUTE запроса (например, для EXPLAIN ANALYZE EXECUTE ...)
+    def execute_text(self, name: str) -> str:
+        return self._statements[name][1]
+
+    # Выполняет зарегистрированный запрос, подготавливая его на соединении при необходимости
+    def execute(self, cursor, name: str, params: dict = None):
+        prepare, execute = self._statements[name]
+        conn = cursor.connection
+        if name not in conn.prepared:
+            cursor.execute(prepare)
+            conn.prepared.add(name)
+            with self._lock:
+                self.prepares += 1
+        cursor.execute(execute, params or {})
+        with self._lock:
+            self.executions += 1
+
+    def stats(self) -> dict:
+        return {
+            "statements": len(self._statements),
+            "prepares": self.prepares,
+            "executions": self.executions
+        }
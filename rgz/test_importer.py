@@ -0,0 +1,33 @@
+import io
+import unittest
+from decimal import Decimal
+from importer import parse_sum, parse_statement
+
+
+class TestImporter(unittest.TestCase):
+    # Набор юнит-тестов для разбора выписок (запуск: python -m unittest из каталога rgz).
+
+    def test_sum_rounds_half_up(self):
+        # Тест: половина копейки округляется вверх, как в /add_operation и в PostgreSQL
+        self.assertEqual(parse_sum("1 000,005"), Decimal("1000.01"))
+
+    def test_huge_sum(self):
+        # Тест: слишком большая сумма - ошибка строки, а не InvalidOperation
+        with self.assertRaises(ValueError):
+            parse_sum("1E+30")
+
+    def test_huge_sum_rejects_only_its_row(self):
+        # Тест: одна строка с огромной суммой не срывает импорт остальных строк
+        result = parse_statement(io.BytesIO("01.01.2024;5;\n01.01.2024;1E+30;\n".encode()), 1)
+        self.assertEqual(result.accepted, 1)
+        self.assertEqual(result.rejected, 1)
+
+    def test_semicolon_with_decimal_comma(self):
+        # Тест: выписка без заголовка с разделителем ";" и десятичной запятой
+        result = parse_statement(io.BytesIO("01.01.2024;1500,50;ДОХОД\n02.01.2024;10,00;РАСХОД\n".encode()), 1)
+        self.assertEqual(result.accepted, 2)
+        self.assertEqual(result.rejected, 0)
+
+
+if __name__ == "__main__":
+    unittest.main()
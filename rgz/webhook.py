@@ -0,0 +1,245 @@
+import os # Для доступа к переменным окружения
+import queue # Исключение переполнения очереди
+import asyncio # Для работы цикла событий в процессах-обработчиках
+import logging # Для записи событий (логирования)
+import multiprocessing # Процессы-обработчики и очереди между процессами
+from aiohttp import web # HTTP-сервер для приёма апдейтов
+from aiogram import Bot # Для регистрации webhook в Telegram
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Параметры запуска задаются через переменные окружения
+API_TOKEN = os.getenv("API_TOKEN")
+WEBHOOK_URL = os.getenv("WEBHOOK_URL")  # Публичный адрес, который регистрируется в Telegram
+WEBHOOK_SECRET = os.getenv("WEBHOOK_SECRET")  # Проверяется в заголовке каждого запроса
+WEBHOOK_HOST = os.getenv("WEBHOOK_HOST", "127.0.0.1")
+WEBHOOK_PORT = int(os.getenv("WEBHOOK_PORT", "8080"))
+WEBHOOK_PATH = "/webhook"
+WORKERS = int(os.getenv("WEBHOOK_WORKERS", str(os.cpu_count() or 1)))
+# Общие ограничения делятся между обработчиками, у каждого свой пул и свой планировщик:
+# DB_POOL_MAX - соединений с БД на все процессы (max_connections в PostgreSQL - 100),
+# OUTBOUND_GLOBAL_RATE - сообщений в секунду на бота (ограничение Telegram)
+WORKER_DB_POOL_MAX = max(1, int(os.getenv("DB_POOL_MAX", "20")) // WORKERS)
+WORKER_DB_POOL_MIN = min(int(os.getenv("DB_POOL_MIN", "2")), WORKER_DB_POOL_MAX)
+WORKER_GLOBAL_RATE = float(os.getenv("OUTBOUND_GLOBAL_RATE", "30")) / WORKERS
+# Сколько апдейтов может ждать в очереди одного обработчика (дальше - 503, Telegram повторит)
+QUEUE_SIZE = int(os.getenv("WEBHOOK_QUEUE_SIZE", "10000"))
+# Сколько необработанных апдейтов может быть у одного чата (дальше - 503)
+CHAT_BACKLOG = int(os.getenv("WEBHOOK_CHAT_BACKLOG", "20"))
+# Сколько апдейтов разных чатов обработчик выполняет одновременно
+WORKER_CONCURRENCY = int(os.getenv("WEBHOOK_WORKER_CONCURRENCY", "100"))
+# Режим замера: исходящие вызовы не отправляются в Telegram, webhook не регистрируется
+DRY_RUN = os.getenv("WEBHOOK_DRY_RUN") == "1"
+# Как часто проверяется, что процессы-обработчики живы, секунды
+WATCHDOG_INTERVAL = float(os.getenv("WEBHOOK_WATCHDOG_INTERVAL", "1"))
+
+
+# chat_id, к которому относится апдейт (0, если чата нет)
+def extract_chat_id(update: dict) -> int:
+    for key, value in update.items():
+        if not isinstance(value, dict):
+            continue
+        chat = value.get("chat") or (value.get("message") or {}).get("chat")
+        if chat:
+            return chat["id"]
+        user = value.get("from")
+        if user:
+            return user["id"]
+    return 0
+
+
+# Обработка одного апдейта после завершения предыдущего апдейта того же чата.
+# Место в limit занимается только после этого: апдейты, ждущие свой чат,
+# не мешают выполняться апдейтам других чатов.
+async def handle_update(bot_module, previous, update: dict, limit, processed, done, index: int, chat_id: int):
+    if previous is not None:
+        await asyncio.gather(previous, return_exceptions=True)
+    try:
+        async with limit:
+            await bot_module.dp.feed_raw_update(bot_module.bot, update)
+    except Exception as e:
+        logger.error(f"Ошибка при обработке апдейта {update.get('update_id')}: {e}")
+    finally:
+        with processed.get_lock():
+            processed.value += 1
+        # Сообщаем приёмнику, что у чата стало на один ожидающий апдейт меньше
+        done.put((index, chat_id))
+
+
+# Процесс-обработчик: свой цикл событий, пул соединений с БД и диспетчер.
+# Апдейты одного чата всегда попадают в один процесс и выполняются
+# строго по очереди, апдейты разных чатов - параллельно.
+async def run_worker(index: int, updates, processed, done):
+    import bot as bot_module  # Импорт в процессе-обработчике: у каждого свой диспетчер
+    if DRY_RUN:
+        from load_test import RecordingSession
+        bot_module.bot.session = RecordingSession()
+
+    await bot_module.dp.emit_startup()
+    logger.info(f"Обработчик {index} запущен")
+
+    loop = asyncio.get_running_loop()
+    limit = asyncio.Semaphore(WORKER_CONCURRENCY)
+    tails = {}  # chat_id -> задача последнего апдейта чата
+
+    def release(task, chat_id):
+        if tails.get(chat_id) is task:
+            del tails[chat_id]
+
+    # Число апдейтов в обработчике ограничивает приёмник (WEBHOOK_QUEUE_SIZE
+    # на обработчик и WEBHOOK_CHAT_BACKLOG на чат), поэтому очередь читается без ожидания
+    try:
+        while True:
+            item = await loop.run_in_executor(None, updates.get)
+            if item is None:
+                break
+            chat_id, update = item
+            task = asyncio.create_task(
+                handle_update(bot_module, tails.get(chat_id), update, limit, processed, done, index, chat_id)
+            )
+            tails[chat_id] = task
+            task.add_done_callback(lambda t, c=chat_id: release(t, c))
+    finally:
+        await asyncio.gather(*tails.values(), return_exceptions=True)
+        await bot_module.dp.emit_shutdown()
+
+
+def worker_main(index: int, updates, processed, done):
+    # Доля общих ограничений; переменные читаются при импорте bot и db
+    os.environ["DB_POOL_MAX"] = str(WORKER_DB_POOL_MAX)
+    os.environ["DB_POOL_MIN"] = str(WORKER_DB_POOL_MIN)
+    os.environ["OUTBOUND_GLOBAL_RATE"] = str(WORKER_GLOBAL_RATE)
+    asyncio.run(run_worker(index, updates, processed, done))
+
+
+# Приём апдейта: проверяем секрет и передаём апдейт процессу по chat_id
+async def handle_webhook(request: web.Request):
+    if WEBHOOK_SECRET and request.headers.get("X-Telegram-Bot-Api-Secret-Token") != WEBHOOK_SECRET:
+        return web.Response(status=403)
+
+    update = await request.json()
+    chat_id = extract_chat_id(update)
+    app = request.app
+    index = chat_id % len(app["queues"])
+    # Обработчик упал: апдейт не принимаем, Telegram повторит его после перезапуска
+    if not app["workers"][index].is_alive():
+        return web.Response(status=503)
+    # Один чат не может занять обработчик своей очередью апдейтов
+    if app["pending"].get(chat_id, 0) >= CHAT_BACKLOG or app["in_flight"][index] >= QUEUE_SIZE:
+        return web.Response(status=503)
+    try:
+        app["queues"][index].put_nowait((chat_id, update))
+    except queue.Full:
+        return web.Response(status=503)
+    app["pending"][chat_id] = app["pending"].get(chat_id, 0) + 1
+    app["in_flight"][index] += 1
+    app["received"] += 1
+    return web.Response()
+
+
+# Учитываем обработанные апдейты: уменьшаем счётчики ожидающих апдейтов
+async def track_done(app: web.Application):
+    loop = asyncio.get_running_loop()
+    while True:
+        item = await loop.run_in_executor(None, app["done"].get)
+        if item is None:
+            break
+        index, chat_id = item
+        # Счётчики перезапущенного обработчика уже сброшены
+        app["in_flight"][index] = max(app["in_flight"][index] - 1, 0)
+        count = app["pending"].get(chat_id, 0) - 1
+        if count > 0:
+            app["pending"][chat_id] = count
+        else:
+            app["pending"].pop(chat_id, None)
+
+
+def start_worker(app: web.Application, index: int):
+    context = multiprocessing.get_context("spawn")
+    app["workers"][index] = context.Process(
+        target=worker_main,
+        args=(index, app["queues"][index], app["processed"][index], app["done"]),
+        daemon=True
+    )
+    app["workers"][index].start()
+
+
+# Перезапуск упавших обработчиков. Апдейты, которые были в упавшем процессе,
+# потеряны: их счётчики сбрасываются, иначе чаты обработчика навсегда
+# упрутся в WEBHOOK_CHAT_BACKLOG. Очередь создаётся заново - процесс мог
+# упасть, удерживая её блокировку.
+async def watch_workers(app: web.Application):
+    context = multiprocessing.get_context("spawn")
+    workers = len(app["workers"])
+    while True:
+        await asyncio.sleep(WATCHDOG_INTERVAL)
+        for index, process in enumerate(app["workers"]):
+            if process.is_alive():
+                continue
+            logger.error(f"Обработчик {index} завершился (код {process.exitcode}), "
+                         f"потеряно апдейтов: {app['in_flight'][index]}; перезапуск")
+            app["in_flight"][index] = 0
+            for chat_id in [c for c in app["pending"] if c % workers == index]:
+                del app["pending"][chat_id]
+            app["queues"][index] = context.Queue(maxsize=QUEUE_SIZE)
+            start_worker(app, index)
+
+
+# Счётчики для замера: принято апдейтов и обработано каждым процессом
+async def handle_stats(request: web.Request):
+    app = request.app
+    return web.json_response({
+        "workers": len(app["queues"]),
+        "received": app["received"],
+        "in_flight": app["in_flight"],
+        "processed": [counter.value for counter in app["processed"]]
+    })
+
+
+async def on_startup(app: web.Application):
+    context = multiprocessing.get_context("spawn")
+    app["queues"] = [context.Queue(maxsize=QUEUE_SIZE) for _ in range(WORKERS)]
+    app["processed"] = [context.Value("q", 0) for _ in range(WORKERS)]
+    app["done"] = context.Queue()  # (обработчик, chat_id) обработанных апдейтов
+    app["pending"] = {}  # chat_id -> принято, но ещё не обработано
+    app["in_flight"] = [0] * WORKERS
+    app["received"] = 0
+    app["workers"] = [None] * WORKERS
+    for index in range(WORKERS):
+        start_worker(app, index)
+    app["done_tracker"] = asyncio.create_task(track_done(app))
+    app["watchdog"] = asyncio.create_task(watch_workers(app))
+
+    if not DRY_RUN and WEBHOOK_URL:
+        bot = Bot(token=API_TOKEN)
+        await bot.set_webhook(WEBHOOK_URL + WEBHOOK_PATH, secret_token=WEBHOOK_SECRET)
+        await bot.session.close()
+    logger.info(f"Webhook запущен: {WORKERS} обработчиков")
+
+
+async def on_shutdown(app: web.Application):
+    app["watchdog"].cancel()
+    # Сигнал завершения каждому процессу; они дообрабатывают свои очереди
+    for updates in app["queues"]:
+        updates.put(None)
+    loop = asyncio.get_running_loop()
+    for process in app["workers"]:
+        await loop.run_in_executor(None, process.join)
+    app["done"].put(None)
+    await app["done_tracker"]
+
+
+def create_app() -> web.Application:
+    app = web.Application()
+    app.router.add_post(WEBHOOK_PATH, handle_webhook)
+    app.router.add_get("/stats", handle_stats)
+    app.on_startup.append(on_startup)
+    app.on_shutdown.append(on_shutdown)
+    return app
+
+
+if __name__ == "__main__":
+    # Режим webhook для бота rgz вместо dp.start_polling:
+    #   WEBHOOK_URL=https://example.org WEBHOOK_SECRET=... WEBHOOK_WORKERS=4 python webhook.py
+    web.run_app(create_app(), host=WEBHOOK_HOST, port=WEBHOOK_PORT)
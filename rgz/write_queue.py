@@ -0,0 +1,142 @@
+import asyncio # Очередь и фоновая задача записи
+import logging # Для записи событий (логирования)
+from collections import Counter # Распределение размеров пакетов
+from psycopg2.extras import execute_values # Многострочные INSERT одним запросом
+from db import add_to_balances, insert_operation # Запись операций и агрегатов
+
+logger = logging.getLogger(__name__)
+
+
+# Записывает пакет операций и агрегаты одной транзакцией (один commit на пакет).
+# items - список кортежей (дата, сумма, chat_id, тип операции).
+def write_batch(cursor, items: list):
+    execute_values(
+        cursor,
+        "INSERT INTO operations (date, sum, chat_id, type_operation) VALUES %s",
+        items
+    )
+    # Суммируем пакет по пользователям и месяцам
+    per_chat = {}
+    for date, amount, chat_id, type_operation in items:
+        monthly = per_chat.setdefault(chat_id, {})
+        totals = monthly.setdefault(date.replace(day=1), [0, 0])
+        totals[0 if type_operation == "ДОХОД" else 1] += amount
+    # Фиксированный порядок блокировок строк balances между транзакциями
+    for chat_id in sorted(per_chat):
+        monthly = {month: tuple(values) for month, values in per_chat[chat_id].items()}
+        add_to_balances(cursor, chat_id, monthly)
+
+
+# Очередь отложенной записи операций (group commit).
+# Вставки из разных чатов собираются в пакет, пока не наберётся max_batch
+# операций или не истечёт max_delay секунд с первой операции пакета.
+# Пакет фиксируется одним commit, и только после этого отправители
+# получают подтверждение. max_delay = 0 - записывать без ожидания
+# (меньше задержка, больше commit'ов); большие значения повышают пропускную способность.
+class OperationWriteQueue:
+    def __init__(self, database, max_batch: int = 100, max_delay: float = 0.01):
+        self.database = database
+        self.max_batch = max_batch
+        self.max_delay = max_delay
+        self._queue = None
+        self._worker = None
+        self.batch_sizes = Counter()  # размер пакета -> количество пакетов
+
+    # Запускаем фоновую задачу записи (при старте бота)
+    def start(self):
+        if self._worker is None:
+            self._queue = asyncio.Queue()
+            self._worker = asyncio.create_task(self._run())
+
+    # Дописываем оставшиеся операции и останавливаем задачу (при остановке бота)
+    async def stop(self):
+        if self._worker is None:
+            return
+        await self._queue.join()
+        self._worker.cancel()
+        try:
+            await self._worker
+        except asyncio.CancelledError:
+            pass
+        self._worker = None
+
+    # Ставит операцию в очередь и ждёт, пока её пакет будет зафиксирован
+    async def submit(self, date, amount, chat_id: int, type_operation: str):
+        if self._worker is None:
+            raise RuntimeError("Очередь записи не запущена")
+        future = asyncio.get_running_loop().create_future()
+        await self._queue.put(((date, amount, chat_id, type_operation), future))
+        await future
+
+    # Собираем пакет: ждём первую операцию, затем добираем до лимита или таймаута
+    async def _collect(self) -> list:
+        batch = [await self._queue.get()]
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + self.max_delay
+        while len(batch) < self.max_batch:
+            # Сначала забираем то, что уже лежит в очереди
+            if not self._queue.empty():
+                batch.append(self._queue.get_nowait())
+                continue
+            timeout = deadline - loop.time()
+            if timeout <= 0:
+                break
+            try:
+                batch.append(await asyncio.wait_for(self._queue.get(), timeout))
+            except asyncio.TimeoutError:
+                break
+        return batch
+
+    async def _run(self):
+        while True:
+            batch = await self._collect()
+            try:
+                await self._write(batch)
+            finally:
+                for _ in batch:
+                    self._queue.task_done()
+
+    async def _write(self, batch: list):
+        items = [item for item, _ in batch]
+        try:
+            # Секции для месяцев пакета создаются до вставки отдельной транзакцией
+            await self.database.run_with_partitions([item[0] for item in items], write_batch, items)
+            self.batch_sizes[len(batch)] += 1
+            results = [None] * len(batch)
+        except Exception as e:
+            # Одна ошибочная строка не должна отменять весь пакет:
+            # повторяем запись по одной операции
+            logger.error(f"Ошибка при записи пакета из {len(batch)} операций: {e}")
+            results = []
+            for item in items:
+                try:
+                    await self.database.run_with_partitions([item[0]], insert_operation, *item)
+                    self.batch_sizes[1] += 1
+                    results.append(None)
+                except Exception as item_error:
+                    results.append(item_error)
+
+        for (_, future), error in zip(batch, results):
+            if future.done():
+                continue
+            if error is None:
+                future.set_result(None)
+            else:
+                future.set_exception(error)
+
+    # Статистика: текущая длина очереди и распределение размеров пакетов
+    # по интервалам 1, 2-3, 4-7, 8-15, ...
+    def stats(self) -> dict:
+        buckets = Counter()
+        for size, count in self.batch_sizes.items():
+            low = 1 << (size.bit_length() - 1)
+            label = str(low) if low == 1 else f"{low}-{2 * low - 1}"
+            buckets[label] += count
+        batches = sum(self.batch_sizes.values())
+        operations = sum(size * count for size, count in self.batch_sizes.items())
+        return {
+            "queued": self._queue.qsize() if self._queue is not None else 0,
+            "batches": batches,
+            "avg_batch": round(operations / batches, 2) if batches else 0.0,
+            "distribution": dict(sorted(buckets.items(), key=lambda item: int(item[0].split("-")[0])))
+        }